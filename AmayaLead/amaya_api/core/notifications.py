@@ -62,3 +62,13 @@ def notify_scrape_done(leads_added: int, task_name: str):
         body=f"Found {leads_added} new lead{'s' if leads_added != 1 else ''} for '{task_name}'.",
         metadata={"leads_added": leads_added, "task_name": task_name},
     )
+
+
+def notify_retry_scrape_done(leads_found: int, leads_retried: int):
+    Notification.objects.create(
+        type=Notification.Type.SCRAPE_DONE,
+        lead=None,
+        title="Re-scrape complete",
+        body=f"Found new emails for {leads_found} of {leads_retried} lead{'s' if leads_retried != 1 else ''}.",
+        metadata={"leads_found": leads_found, "leads_retried": leads_retried},
+    )
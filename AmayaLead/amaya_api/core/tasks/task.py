@@ -1,4 +1,6 @@
 import os
+import json
+import time
 import requests
 from django.db import transaction
 from datetime import timedelta, datetime, timezone as dt_timezone
@@ -7,7 +9,7 @@ from django_q.tasks import schedule
 from django_q.models import Task, Schedule
 from django.conf import settings
 from amaya_api.models import Lead, Email
-from amaya_api.core.notifications import notify_scrape_done
+from amaya_api.core.notifications import notify_scrape_done, notify_retry_scrape_done
 
 
 if os.getenv("DJANGO_ENV") != "prod":
@@ -16,6 +18,9 @@ else:
     SCRAPING_URL = 'http://scraper:8001'
 
 EMAIL_FUNC = 'amaya_api.core.email.mail_helper.send_mail_to_lead'
+# Seconds between polls of a scraper job, and the timeout for each poll
+SCRAPE_JOB_POLL_SECS = 5
+SCRAPE_JOB_HTTP_TIMEOUT = 10
 # Business hours start (UTC). Overflow emails land here on their target day.
 EMAIL_DAY_START_HOUR = 9
 
@@ -39,14 +44,6 @@ def fetch_and_scrape_task(data):
     emails.  Emails that exceed today's daily limit roll over to the next
     available day (up to 7 days ahead) instead of being silently dropped."""
 
-    response = requests.post(url=f"{SCRAPING_URL}/fetch_and_scrape_places", json=data)
-    response.raise_for_status()
-    result = response.json()
-
-    if not isinstance(result, list) and result.get('status_code') == 500:
-        msg = result.get('detail') or result.get('Error Scraping') or result.get('error') or str(result)
-        raise Exception(msg)
-
     daily_limit = getattr(settings, 'EMAIL_DAILY_LIMIT', 400)
     delay_mins = getattr(settings, 'EMAIL_MIN_DELAY_MINS', 2)
     now = timezone.now()  # captured at execution time, not import time
@@ -90,73 +87,107 @@ def fetch_and_scrape_task(data):
 
         return None  # no capacity in the next 7 days
 
-    leads_added = 0
-
-    with transaction.atomic():
-        for place in result:
-            place_id = place.get("place_id", "")
-            if not place_id:
-                continue
-
-            lead = Lead.objects.filter(place_id=place_id).first()
-
-            if lead:
-                existing_emails = set(
-                    Email.objects.filter(business=lead).values_list('email', flat=True)
+    def _save_place(place) -> int:
+        """Save one scraped place and schedule its emails.  Returns 1 when a
+        new lead was created."""
+        place_id = place.get("place_id", "")
+        if not place_id:
+            return 0
+
+        lead = Lead.objects.filter(place_id=place_id).first()
+
+        if lead:
+            existing_emails = set(
+                Email.objects.filter(business=lead).values_list('email', flat=True)
+            )
+            new_emails = set(place.get('emails', []))
+            emails_to_add = new_emails - existing_emails
+            if emails_to_add:
+                Email.objects.bulk_create(
+                    [Email(business=lead, email=e) for e in emails_to_add]
                 )
-                new_emails = set(place.get('emails', []))
-                emails_to_add = new_emails - existing_emails
-                if emails_to_add:
-                    Email.objects.bulk_create(
-                        [Email(business=lead, email=e) for e in emails_to_add]
-                    )
-            else:
-                name = place.get("displayName", {}).get('text', '')
-                types = place.get("types", ["unknown"])
-                website = place.get("websiteUri", "")
-                formatted_address = place.get("formattedAddress", "")
-                opening_hours = place.get("weeklyOpeningHours", "")
-                national_pn = place.get("nationalPhoneNumber")
-                international_pn = place.get("internationalPhoneNumber", "")
-                scrape_error = place.get("scrape_error", "")
-
-                lead = Lead(
-                    place_id=place_id,
-                    name=name,
-                    business_types=", ".join(types),
-                    website=website,
-                    formatted_address=formatted_address,
-                    weekly_opening_hours=opening_hours,
-                    national_phone_number=national_pn,
-                    international_phone_number=international_pn,
-                    scrape_error=scrape_error,
+        else:
+            name = place.get("displayName", {}).get('text', '')
+            types = place.get("types", ["unknown"])
+            website = place.get("websiteUri", "")
+            formatted_address = place.get("formattedAddress", "")
+            opening_hours = place.get("weeklyOpeningHours", "")
+            national_pn = place.get("nationalPhoneNumber")
+            international_pn = place.get("internationalPhoneNumber", "")
+            scrape_error = place.get("scrape_error", "")
+
+            lead = Lead(
+                place_id=place_id,
+                name=name,
+                business_types=", ".join(types),
+                website=website,
+                formatted_address=formatted_address,
+                weekly_opening_hours=opening_hours,
+                national_phone_number=national_pn,
+                international_phone_number=international_pn,
+                scrape_error=scrape_error,
+            )
+            lead.save()
+
+            emails = place.get('emails', [])
+            if emails:
+                Email.objects.bulk_create(
+                    [Email(business=lead, email=e) for e in emails]
                 )
-                lead.save()
-                leads_added += 1
 
-                emails = place.get('emails', [])
-                if emails:
-                    Email.objects.bulk_create(
-                        [Email(business=lead, email=e) for e in emails]
+            for email_addr in emails:
+                next_run = _next_run_for(email_addr, name)
+                if next_run is None:
+                    print(
+                        f"[task] No email slots in the next 7 days — "
+                        f"skipping {email_addr} for {name}."
                     )
+                    continue
+                schedule(
+                    EMAIL_FUNC,
+                    email_addr,
+                    name,
+                    name=f"Email → {name} <{email_addr}>",
+                    schedule_type='O',
+                    next_run=next_run,
+                    repeats=1,
+                )
+            return 1
+        return 0
 
-                for email_addr in emails:
-                    next_run = _next_run_for(email_addr, name)
-                    if next_run is None:
-                        print(
-                            f"[task] No email slots in the next 7 days — "
-                            f"skipping {email_addr} for {name}."
-                        )
-                        continue
-                    schedule(
-                        EMAIL_FUNC,
-                        email_addr,
-                        name,
-                        name=f"Email → {name} <{email_addr}>",
-                        schedule_type='O',
-                        next_run=next_run,
-                        repeats=1,
-                    )
+    leads_added = 0
+
+    # The scraper streams one NDJSON line per place as soon as it is crawled,
+    # so leads are saved (and emails scheduled) while later sites are still in
+    # flight, and a dropped connection keeps everything received so far.
+    response = requests.post(
+        url=f"{SCRAPING_URL}/fetch_and_scrape_places",
+        json={**data, "stream": True},
+        stream=True,
+        timeout=(10, None),
+    )
+    response.raise_for_status()
+
+    stream_error = None
+    try:
+        for line in response.iter_lines(decode_unicode=True):
+            if not line:
+                continue
+            msg = json.loads(line)
+
+            if msg.get('status_code') == 500:
+                err = msg.get('detail') or msg.get('Error Scraping') or msg.get('error') or str(msg)
+                raise Exception(err)
+
+            if msg.get('type') == 'place':
+                with transaction.atomic():
+                    leads_added += _save_place(msg['place'])
+            elif msg.get('type') == 'summary':
+                print(f"[task] Scrape finished: {msg}")
+    except requests.RequestException as e:
+        # Leads received so far are already committed; report them, then fail
+        print(f"[task] Scraper stream dropped after {leads_added} new leads: {e}")
+        stream_error = e
 
     task_name = data.get("query", "unknown")
     try:
@@ -164,4 +195,57 @@ def fetch_and_scrape_task(data):
     except Exception as e:
         print(f"[task] Failed to create scrape notification: {e}")
 
+    if stream_error is not None:
+        raise stream_error
+
     return f"{leads_added} New Leads"
+
+
+def retry_scrape_task(job_id):
+    """Follows a scrape job on the scraper service and saves newly found
+    emails as results come in.  Queued by the retry_scrape view so neither
+    the web worker nor this task holds a socket open for the whole crawl."""
+
+    found_emails = 0
+    offset = 0
+    job = {}
+
+    while True:
+        response = requests.get(
+            url=f"{SCRAPING_URL}/jobs/{job_id}/results",
+            params={"offset": offset, "limit": 50},
+            timeout=SCRAPE_JOB_HTTP_TIMEOUT,
+        )
+        response.raise_for_status()
+        job = response.json()
+
+        for res_place in job['results']:
+            lead = Lead.objects.filter(place_id=res_place['place_id']).first()
+            if lead is None:
+                continue
+            new_emails = set(res_place.get('emails', []))
+            existing_emails = set(Email.objects.filter(business=lead).values_list('email', flat=True))
+            emails_to_add = new_emails - existing_emails
+            if emails_to_add:
+                found_emails += 1
+                with transaction.atomic():
+                    Email.objects.bulk_create(
+                        [Email(business=lead, email=email) for email in emails_to_add]
+                    )
+                    lead.scrape_error = ""
+                    lead.save()
+
+        offset += len(job['results'])
+        if job['next_offset'] is None:
+            break
+        if job['status'] not in ('queued', 'running') and not job['results']:
+            break
+        if not job['results']:
+            time.sleep(SCRAPE_JOB_POLL_SECS)
+
+    try:
+        notify_retry_scrape_done(found_emails, job.get('total', 0))
+    except Exception as e:
+        print(f"[task] Failed to create retry notification: {e}")
+
+    return f"Found emails for {found_emails} leads"
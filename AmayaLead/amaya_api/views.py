@@ -17,7 +17,7 @@ from django.utils import timezone
 from django_q.tasks import async_task,schedule
 from amaya_api.core.email.mail_helper import send_mail_to_lead,send_email
 from amaya_api.core.calls.call_helper import get_audio, sync_conversation_statuses, get_conversation_transcript
-from .core.tasks.task import fetch_and_scrape_task
+from .core.tasks.task import fetch_and_scrape_task, retry_scrape_task, SCRAPE_JOB_HTTP_TIMEOUT
 from rest_framework.response import Response
 from django.forms.models import model_to_dict
 from django.shortcuts import get_object_or_404
@@ -161,36 +161,22 @@ def retry_scrape(req):
     data = req.data
     places = data.get('places')
 
-    found_emails =0
-
     if not places:
         return Response({"error": "no places given"}, status=status.HTTP_400_BAD_REQUEST)
     db_places = list(Lead.objects.filter(place_id__in=places))
 
     payload = [[str(p.place_id), str(p.website)] for p in db_places]
-    result = []
 
     try:
-        response = requests.post(url=f"{SCRAPING_URL}/scrape_places", json={
+        # Submit a background job on the scraper; a queued task follows it and
+        # saves the emails, so this request returns immediately.
+        response = requests.post(url=f"{SCRAPING_URL}/jobs", json={
                                      "places": payload
-                                 })
+                                 }, timeout=SCRAPE_JOB_HTTP_TIMEOUT)
         response.raise_for_status()
+        job = response.json()
 
-        result = response.json()
-
-        for lead, res_place in zip(db_places, result):
-            new_emails = set(res_place[1])
-            existing_emails = set(Email.objects.filter(business=lead).values_list('email',flat=True))
-            emails_to_add = new_emails - existing_emails
-            if emails_to_add:
-                found_emails +=1
-                Email.objects.bulk_create(
-                    [
-                        Email(business=lead,email=email) for email in emails_to_add
-                    ]
-                )
-                lead.scrape_error = ""
-                lead.save()
+        task_id = async_task(retry_scrape_task, job['job_id'], task_name="Retry Scrape", group="Scrape Group")
     except Exception as e:
         return Response(
             {
@@ -201,9 +187,11 @@ def retry_scrape(req):
 
     return Response(
         {
-            "found": found_emails
+            "job_id": job['job_id'],
+            "task_id": task_id,
+            "total": job['total'],
         },
-        status=status.HTTP_200_OK
+        status=status.HTTP_202_ACCEPTED
     )
 
 
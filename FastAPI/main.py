@@ -1,25 +1,54 @@
-from fastapi import FastAPI, HTTPException
+from dotenv import load_dotenv
+# Before the imports below: scraper_pool and friends read their settings at import
+load_dotenv()
+
+from fastapi import FastAPI, HTTPException, Response
+from fastapi.responses import StreamingResponse
 from places.places_api import fetch_places_by_query
 from AI.filter_emails import filter_emails
 from AI.generate_reply import generate_reply_suggestions, Message as AIMessage, AiSuggestion
 from providers.apify_fetch import fetch_places_by_query_via_apify
 from scraper.utils import is_junk_email
+from scraper.cms import cms_stats
+from scraper_pool import pool as scraper_pool
+from scrape_jobs import ScrapeJobStore
+from scrape_cache import cache as scrape_cache
+from preflight import DEAD_SITE_ERRORS, check_sites
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import partial
 from pydantic import BaseModel
 import sys
-import tempfile
 import logging
 from typing import Optional
 import os
-import uuid
-import subprocess
-from dotenv import load_dotenv
 import json
 from lead_types import HashablePlace
 from typing import List
 import traceback
-app = FastAPI()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Warm the scraper workers before the first request instead of on it
+    scraper_pool.start()
+    yield
+    scraper_pool.shutdown()
+
+app = FastAPI(lifespan=lifespan)
 
 SCRAPER_TIMEOUT = 60
+# Places scraped in parallel per request; the worker pool size is the hard cap
+SCRAPER_CONCURRENCY = int(os.getenv("SCRAPER_CONCURRENCY", str(scraper_pool.size)))
+
+
+def scrape_concurrency(requested: int | None) -> int:
+    """
+    Places to scrape at once for a request or job: what it asked for (or
+    SCRAPER_CONCURRENCY), never more than there are pool workers, since the
+    rest would only queue for a worker.
+    """
+    return max(1, min(requested or SCRAPER_CONCURRENCY, scraper_pool.size))
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -36,7 +65,6 @@ def normalize_hours(data):
         result_parts.append(formatted)
     return ', '.join(result_parts)
 
-load_dotenv()
 USE_APIFY = os.getenv("USE_APIFY", "true").lower() == "true"
 
 
@@ -51,6 +79,102 @@ class FetchRequest(BaseModel):
     state:Optional[str] = None
     zipcode:Optional[str] = None
     county:Optional[str] = None
+    # How many places to scrape at once; defaults to SCRAPER_CONCURRENCY,
+    # capped at the worker pool size
+    concurrency:Optional[int] = None
+    # Stream NDJSON lines as places finish instead of one list at the end
+    stream:bool = False
+    # Ignore cached results and re-crawl every website
+    refresh:bool = False
+
+
+def cached_scrape(url: str, depth: int, timeout: float, refresh: bool = False) -> dict:
+    """
+    scraper_pool.scrape behind the per-site result cache.  The result's
+    "cached" key says whether it was served from the cache; refresh=True
+    skips the lookup and re-crawls.
+    """
+    if not refresh:
+        hit = scrape_cache.get(url, depth)
+        if hit is not None:
+            return hit
+
+    result = scraper_pool.scrape(url, depth=depth, retries=5, timeout=timeout)
+    result['cached'] = False
+    cms = result.get("cms")
+    if cms:
+        cms_stats.record(cms["name"], bool(cms["emails"]), cms["ms"] / 1000)
+    # Crashes, worker errors and refusals aren't stored (see scrape_cache.put)
+    scrape_cache.put(url, result, depth)
+    return result
+
+
+def preflight_sites(urls: list[str], refresh: bool = False) -> dict[str, str]:
+    """
+    Liveness check for every website not already cached; returns
+    {url: scrape_error} for dead ones, which are cached as failures too.
+    """
+    unchecked = [u for u in urls if u and (refresh or scrape_cache.get(u) is None)]
+    dead = check_sites(unchecked)
+    for url, error in dead.items():
+        scrape_cache.put(url, {"status": "dead", "error": error, "emails": []})
+    if dead:
+        logger.info(f"Preflight: {len(dead)} of {len(unchecked)} websites are dead")
+    return dead
+
+
+def scrape_place(place: dict, refresh: bool = False, dead: dict[str, str] | None = None) -> dict:
+    """
+    Scrape one place's website in place and return it.  Websites in dead
+    (from preflight_sites) get its scrape_error without being crawled.
+    """
+    url = place.get('websiteUri')
+    place['emails'] = []
+
+    if url and dead and url in dead:
+        place['cached'] = False
+        place['scrape_error'] = dead[url]
+    elif url:
+        result = cached_scrape(url, depth=2, timeout=SCRAPER_TIMEOUT, refresh=refresh)
+        place['cached'] = result['cached']
+        place['emails'] = result.get('emails', [])
+        # Crawl tier that found the first on-domain email and the crawler
+        # stage (cms / static / bundle / spa) that produced the emails; None for
+        # cache hits
+        place['tier'] = result.get('tier')
+        place['stage'] = result.get('stage')
+        if result["status"] != "ok" and not place['emails']:
+            if result["status"] == "timeout":
+                place['scrape_error'] = "Unexpected Error"
+            elif result["status"] == "deadline":
+                place['scrape_error'] = "Deadline Reached"
+            elif result["status"] == "refused":
+                place['scrape_error'] = "Server Busy"
+            elif result.get("error") in DEAD_SITE_ERRORS:
+                # Cached preflight failure
+                place['scrape_error'] = result["error"]
+            else:
+                place['scrape_error'] = "No Email Found"
+    else:
+        place['scrape_error'] = 'No Website Found'
+
+    # Pre-filter obvious junk before spending AI quota
+    if place.get('emails'):
+        place['emails'] = [e for e in place['emails'] if not is_junk_email(e)]
+
+    # AI email filtering disabled — rely on junk filter above
+    # To re-enable, uncomment the block below
+    # if place.get('emails'):
+    #     business_name = place.get('displayName', {}).get('text', '')
+    #     if business_name:
+    #         try:
+    #             filtered_emails = filter_emails(business_name, place['emails'])
+    #             place['emails'] = filtered_emails
+    #         except Exception as e:
+    #             logger.warning(f"Email filtering failed for {business_name}: {e}")
+
+    return place
+
 
 @app.post("/fetch_and_scrape_places")
 def fetch_and_scrape_places(req: FetchRequest):
@@ -90,147 +214,159 @@ def fetch_and_scrape_places(req: FetchRequest):
 
     res = [place.to_dict() for place in fetch_res]
 
-    logger.info(f"The length of places found is {len(res)}")
-    for place in res:
-        url = place.get('websiteUri')
-        place['emails'] = []
-
-        if url:
-            tmp_file = tempfile.NamedTemporaryFile(delete=False, suffix=".txt")
-            tmp_filename = tmp_file.name
-            tmp_file.close()
-
-            try:
-                proc = subprocess.Popen(
-                    args=[sys.executable, '-m', 'scraper_worker', url, '2', '5', tmp_filename],
-                    text=True,
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE
-                )
-
-                try:
-                    out, err = proc.communicate(timeout=SCRAPER_TIMEOUT)
-
-                    if out and out.strip():
-                        result = json.loads(out)
-                        if result.get("status") == "ok":
-                            place['emails'] = result.get('emails', [])
-                        else:
-                            with open(tmp_filename, 'r', encoding='utf-8') as f:
-                                emails = [line.strip() for line in f if line.strip()]
-                            place['emails'] = emails
-                            if not emails:
-                                place['scrape_error'] = "No Email Found"
-                    else:
-                        with open(tmp_filename, 'r', encoding='utf-8') as f:
-                            emails = [line.strip() for line in f if line.strip()]
-                        place['emails'] = emails
-                        if not emails:
-                            place['scrape_error'] = "No Email Found"
-
-                except subprocess.TimeoutExpired:
-                    proc.kill()
-                    with open(tmp_filename, 'r', encoding='utf-8') as f:
-                        emails = [line.strip() for line in f if line.strip()]
-                    place['emails'] = emails
-                    if not emails:
-                        place['scrape_error'] = "Unexpected Error"
-
-                except Exception as e:
-                    proc.kill()
-                    logger.warning(f"Scrape error: {e}")
-                    with open(tmp_filename, 'r', encoding='utf-8') as f:
-                        emails = [line.strip() for line in f if line.strip()]
-                    place['emails'] = emails
-                    if not emails:
-                        place['scrape_error'] = "Unexpected Error"
-
-            except Exception as e:
-                tb = traceback.extract_tb(sys.exc_info()[2])[-1]
-                return HTTPException(
-                    status_code=500,
-                    detail=f"{tb.filename}:{tb.lineno} {str(e)}"
-                )
-
-            finally:
-                if os.path.exists(tmp_filename):
-                    os.remove(tmp_filename)
-        else:
-            place['scrape_error'] = 'No Website Found'
-
-        # Pre-filter obvious junk before spending AI quota
-        if place.get('emails'):
-            place['emails'] = [e for e in place['emails'] if not is_junk_email(e)]
-
-        # AI email filtering disabled — rely on junk filter above
-        # To re-enable, uncomment the block below
-        # if place.get('emails'):
-        #     business_name = place.get('displayName', {}).get('text', '')
-        #     if business_name:
-        #         try:
-        #             filtered_emails = filter_emails(business_name, place['emails'])
-        #             place['emails'] = filtered_emails
-        #         except Exception as e:
-        #             logger.warning(f"Email filtering failed for {business_name}: {e}")
+    concurrency = scrape_concurrency(req.concurrency)
+    logger.info(f"The length of places found is {len(res)}, scraping {concurrency} at a time")
+
+    if req.stream:
+        return StreamingResponse(
+            stream_scraped_places(res, concurrency, req.refresh),
+            media_type="application/x-ndjson",
+        )
+
+    # Weed out dead websites before any crawler starts
+    dead = preflight_sites([place.get('websiteUri') for place in res], req.refresh)
+
+    # map() keeps results in input order; the pool caps how many crawls actually run
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        res = list(executor.map(partial(scrape_place, refresh=req.refresh, dead=dead), res))
 
     return res
 
+
+def stream_scraped_places(places: list[dict], concurrency: int, refresh: bool = False):
+    """
+    Yield one NDJSON line per place as soon as its scrape finishes, then a
+    summary line.  The preflight liveness check runs here too, once the
+    response has started, rather than ahead of it.  Lines look like
+      {"type": "place", "index": <input position>, "place": {...}}
+      {"type": "summary", "total": n, "with_emails": n, "errors": n}
+    """
+    executor = ThreadPoolExecutor(max_workers=concurrency)
+    with_emails = 0
+    errors = 0
+    try:
+        dead = preflight_sites([place.get('websiteUri') for place in places], refresh)
+        futures = {executor.submit(scrape_place, place, refresh, dead): i for i, place in enumerate(places)}
+        for future in as_completed(futures):
+            place = future.result()
+            if place.get('emails'):
+                with_emails += 1
+            if place.get('scrape_error'):
+                errors += 1
+            yield json.dumps({"type": "place", "index": futures[future], "place": place}) + "\n"
+
+        yield json.dumps({
+            "type": "summary",
+            "total": len(places),
+            "with_emails": with_emails,
+            "errors": errors,
+        }) + "\n"
+    finally:
+        # Client went away or we're done — don't start crawls nobody will read
+        executor.shutdown(wait=False, cancel_futures=True)
+
 class PlacesRequest(BaseModel):
     places: list[list[str]]
+    refresh: bool = False
 
 @app.post("/scrape_places")
 def scrape_places(req: PlacesRequest):
     res = []
     places = req.places
+    dead = preflight_sites([place_url for _, place_url in places], req.refresh)
 
     for place in places:
         place_id, place_url = place
         emails = []
+        cached = False
 
         if place_url:
-            # Create a temporary file for the scraper to store results
-            tmp_file = tempfile.NamedTemporaryFile(delete=False, suffix=".txt")
-            tmp_filename = tmp_file.name
-            tmp_file.close()
-
-            try:
-                proc = subprocess.Popen(
-                    args=[sys.executable, '-m', 'scraper_worker', place_url, '1', '5', tmp_filename],
-                    text=True,
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE
-                )
-
-                try:
-                    print("started")
-                    out, err = proc.communicate(timeout=2*SCRAPER_TIMEOUT)
-                    result = json.loads(out)
-                    print(result, err)
-
-                    if result.get("status") == "ok":
-                        emails = result['emails']
-                    else:
-                        with open(tmp_filename, 'r', encoding='utf-8') as f:
-                            emails = [line.strip() for line in f if line.strip()]
-
-                except subprocess.TimeoutExpired:
-                    proc.kill()
-                    with open(tmp_filename, 'r', encoding='utf-8') as f:
-                        emails = [line.strip() for line in f if line.strip()]
-
-                except Exception:
-                    proc.kill()
-                    with open(tmp_filename, 'r', encoding='utf-8') as f:
-                        emails = [line.strip() for line in f if line.strip()]
-
-            finally:
-                if os.path.exists(tmp_filename):
-                    os.remove(tmp_filename)
-
-        res.append((place_id, emails))
+            result = scrape_place_url(place_id, place_url, refresh=req.refresh, dead=dead)
+            emails, cached = result['emails'], result['cached']
+
+        res.append((place_id, emails, cached))
 
     return res
 
+
+def scrape_place_url(place_id: str, place_url: str, refresh: bool = False, dead: dict[str, str] | None = None) -> dict:
+    """Re-scrape a known place's website (shallower crawl, longer timeout)."""
+    result = {"place_id": place_id, "emails": [], "cached": False}
+    if not place_url:
+        result['scrape_error'] = 'No Website Found'
+        return result
+    if dead and place_url in dead:
+        result['scrape_error'] = dead[place_url]
+        return result
+
+    scraped = cached_scrape(place_url, depth=1, timeout=2*SCRAPER_TIMEOUT, refresh=refresh)
+    result['cached'] = scraped['cached']
+    result['emails'] = scraped.get('emails', [])
+    result['tier'] = scraped.get('tier')
+    result['stage'] = scraped.get('stage')
+    if not result['emails']:
+        if scraped["status"] == "timeout":
+            result['scrape_error'] = "Unexpected Error"
+        elif scraped["status"] == "deadline":
+            result['scrape_error'] = "Deadline Reached"
+        elif scraped["status"] == "refused":
+            result['scrape_error'] = "Server Busy"
+        elif scraped.get("error") in DEAD_SITE_ERRORS:
+            result['scrape_error'] = scraped["error"]
+        else:
+            result['scrape_error'] = "No Email Found"
+    return result
+
+
+scrape_jobs = ScrapeJobStore(scrape=scrape_place_url)
+
+
+class ScrapeJobRequest(BaseModel):
+    places: list[list[str]]
+    concurrency: Optional[int] = None
+    refresh: bool = False
+
+
+@app.post("/jobs")
+def submit_scrape_job(req: ScrapeJobRequest):
+    """Start scraping [place_id, url] pairs in the background; returns the job ID."""
+    places = [(place_id, place_url) for place_id, place_url in req.places]
+    job = scrape_jobs.submit(places, scrape_concurrency(req.concurrency), refresh=req.refresh)
+    return job.summary()
+
+
+def _get_job(job_id: str):
+    job = scrape_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job {job_id}")
+    return job
+
+
+@app.get("/jobs/{job_id}")
+def scrape_job_status(job_id: str):
+    return _get_job(job_id).summary()
+
+
+@app.get("/jobs/{job_id}/results")
+def scrape_job_results(job_id: str, offset: int = 0, limit: int = 50):
+    return _get_job(job_id).page(max(0, offset), max(1, limit))
+
+
+@app.delete("/jobs/{job_id}")
+def cancel_scrape_job(job_id: str):
+    """Skip places not started yet; crawls already running finish normally."""
+    _get_job(job_id)
+    return scrape_jobs.cancel(job_id).summary()
+
+@app.get("/stats")
+def scraper_stats():
+    """
+    Per-CMS extractor attempts, hit rates and average timings, and the
+    scraper workers' memory use and recycle counts.
+    """
+    return {"cms": cms_stats.snapshot(), "memory": scraper_pool.memory_stats()}
+
+
 class EmailsReq(BaseModel):
     business_name:str
     emails: list[str]
@@ -253,6 +389,7 @@ def api_filter_emails(req: EmailsReq):
 
 class WebsiteReq(BaseModel):
     url: str
+    refresh: bool = False
 
 
 class MessageModel(BaseModel):
@@ -306,42 +443,17 @@ def generate_reply(req: GenerateReplyRequest) -> List[AiSuggestion]:
 
 
 @app.post("/scrape")
-def scrape_website(req:WebsiteReq):
+def scrape_website(req:WebsiteReq, response: Response):
     res = []
     url = req.url
     if url:
-        try:
-            tmp_filename = f"{uuid.uuid4()}.txt"
-            proc = subprocess.Popen(
-                args = [sys.executable, '-m', 'scraper_worker', url,'1', '5', tmp_filename],
-                text=True,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE
-            )
-            try:
-                out, err = proc.communicate(timeout=SCRAPER_TIMEOUT)
-                result = json.loads(out)
-                if result.get('status', '')=='ok':
-                    emails = result['emails']
-                    res.append(emails)
-                else:
-                    proc.kill()
-                    with open(tmp_filename, 'r', encoding='utf-8') as f:
-                        res = [line.strip() for line in f if line.strip()]
-                    if not res:
-                        return HTTPException(status_code=500, detail=f"Failed to scrape with error: {result['error']}")
-            except subprocess.TimeoutExpired:
-                # Read the results of the temp file for any left overs
-                proc.kill()
-                with open(tmp_filename, 'r', encoding='utf-8') as f:
-                    res = [line.strip() for line in f if line.strip()]
-            except Exception as e:
-                res = []
-                return HTTPException(status_code=500, detail=str(e))
-            finally:
-                os.remove(tmp_filename)
-        except Exception as e:
-            return HTTPException(status_code=500, detail=str(e))
-            res = []
+        result = cached_scrape(url, depth=1, timeout=SCRAPER_TIMEOUT, refresh=req.refresh)
+        response.headers["X-Scrape-Cache"] = "hit" if result['cached'] else "miss"
+        if result["status"] == "ok":
+            res.append(result['emails'])
+        else:
+            res = result.get('emails', [])
+            if not res and result["status"] in ("error", "dead"):
+                return HTTPException(status_code=500, detail=f"Failed to scrape with error: {result['error']}")
 
     return res
@@ -0,0 +1,160 @@
+# preflight.py
+"""
+Batch liveness check for place websites, run before any crawler starts.
+
+A large share of websiteUri values point to expired, parked or unreachable
+domains, and each of those used to burn a worker for up to SCRAPER_TIMEOUT.
+check_sites resolves every host concurrently (resolutions are cached),
+opens a TCP connection and makes one small HTTP request, and returns a
+scrape_error for each dead site:
+  Invalid Website      – no usable host in the URL
+  DNS Lookup Failed    – the host doesn't resolve
+  Website Unreachable  – nothing accepts a connection or answers HTTP
+  Parked Domain        – the page is a registrar/parking placeholder
+A server error (5xx), a DNS timeout or any other transient resolver
+failure is not proof of a dead site; such sites are left for the crawlers.
+"""
+
+import os
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from urllib.parse import urlparse
+import requests
+from scraper.http_client import get_session
+
+PREFLIGHT_CONCURRENCY = int(os.getenv("PREFLIGHT_CONCURRENCY", "32"))
+DNS_TIMEOUT = float(os.getenv("PREFLIGHT_DNS_TIMEOUT", "3"))
+CONNECT_TIMEOUT = float(os.getenv("PREFLIGHT_CONNECT_TIMEOUT", "3"))
+HTTP_TIMEOUT = float(os.getenv("PREFLIGHT_HTTP_TIMEOUT", "8"))
+DNS_TTL = int(os.getenv("PREFLIGHT_DNS_TTL", "3600"))
+DNS_NEGATIVE_TTL = int(os.getenv("PREFLIGHT_DNS_NEGATIVE_TTL", "600"))
+# Bytes of the homepage read to look for parking markers
+_SNIFF_BYTES = 32 * 1024
+
+INVALID = "Invalid Website"
+DNS_FAILED = "DNS Lookup Failed"
+UNREACHABLE = "Website Unreachable"
+PARKED = "Parked Domain"
+DEAD_SITE_ERRORS = (INVALID, DNS_FAILED, UNREACHABLE, PARKED)
+
+# Phrases and hosts that only show up on domain-parking / for-sale pages
+PARKING_MARKERS = (
+    "this domain may be for sale", "this domain is for sale", "buy this domain",
+    "domain is parked", "parked free, courtesy of", "parkingcrew", "sedoparking",
+    "bodis.com", "dan.com/buy-domain", "afternic.com", "hugedomains.com",
+    "godaddy.com/domainfind", "domain has expired", "this domain has expired",
+)
+
+
+class DnsCache:
+    """host → resolved addresses, with separate TTLs for hits and misses."""
+
+    def __init__(self) -> None:
+        self._entries: dict[str, tuple[list[str], float]] = {}
+        self._lock = threading.Lock()
+        self._resolver = ThreadPoolExecutor(max_workers=PREFLIGHT_CONCURRENCY, thread_name_prefix="dns")
+
+    def resolve(self, host: str) -> list[str] | None:
+        """
+        Addresses for host; [] when the name doesn't exist (NXDOMAIN), None
+        when the lookup times out or fails in some other, possibly
+        transient, way.  None isn't cached.
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(host)
+        if entry is not None and entry[1] > now:
+            return entry[0]
+
+        # getaddrinfo has no timeout of its own
+        future = self._resolver.submit(socket.getaddrinfo, host, None, 0, socket.SOCK_STREAM)
+        try:
+            addrs = sorted({info[4][0] for info in future.result(timeout=DNS_TIMEOUT)})
+        except socket.gaierror as e:
+            if e.errno != socket.EAI_NONAME:
+                return None
+            addrs = []
+        except UnicodeError:
+            addrs = []  # not a valid host name at all
+        except (FutureTimeout, OSError):
+            return None
+
+        with self._lock:
+            self._entries[host] = (addrs, now + (DNS_TTL if addrs else DNS_NEGATIVE_TTL))
+        return addrs
+
+
+dns_cache = DnsCache()
+
+
+def _connects(addrs: list[str], port: int) -> bool:
+    for addr in addrs[:3]:
+        try:
+            socket.create_connection((addr, port), timeout=CONNECT_TIMEOUT).close()
+            return True
+        except OSError:
+            continue
+    return False
+
+
+def _is_parked(url: str) -> bool | None:
+    """
+    True for a parking page, False for a live site (or an inconclusive
+    answer, like a 5xx), None if no HTTP answer comes at all.
+    """
+    try:
+        with get_session().get(url, timeout=HTTP_TIMEOUT, stream=True, allow_redirects=True) as r:
+            if r.status_code >= 500:
+                return False  # possibly transient; let the crawlers decide
+            body = next(r.iter_content(_SNIFF_BYTES), b"")
+    except (requests.exceptions.SSLError, requests.exceptions.Timeout):
+        return False  # something is there; let the crawlers decide
+    except requests.RequestException:
+        return None
+    text = body.decode("utf-8", "replace").lower()
+    final = r.url.lower()
+    return any(marker in text or marker in final for marker in PARKING_MARKERS)
+
+
+def check_site(url: str) -> str | None:
+    """scrape_error for a dead site, None if it looks alive."""
+    if "://" not in url:
+        url = f"http://{url}"
+    try:
+        parts = urlparse(url.strip())
+        explicit_port = parts.port
+    except ValueError:
+        return INVALID
+    host = (parts.hostname or "").lower()
+    if not host or "." not in host:
+        return INVALID
+
+    addrs = dns_cache.resolve(host)
+    if addrs is None:
+        return None  # slow or failing resolver; let the crawlers decide
+    if not addrs:
+        return DNS_FAILED
+
+    port = explicit_port or (443 if parts.scheme == "https" else 80)
+    if not _connects(addrs, port):
+        if explicit_port or port != 443 or not _connects(addrs, 80):
+            return UNREACHABLE
+        # Plain-http site listed with an https URL: check it over http
+        url = parts._replace(scheme="http", netloc=parts.netloc.rpartition("@")[2]).geturl()
+
+    parked = _is_parked(url)
+    if parked is None:
+        return UNREACHABLE
+    return PARKED if parked else None
+
+
+def check_sites(urls: list[str], concurrency: int = PREFLIGHT_CONCURRENCY) -> dict[str, str]:
+    """Check every distinct url at once; returns {url: scrape_error} for dead ones."""
+    distinct = sorted({u for u in urls if u})
+    if not distinct:
+        return {}
+    with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(distinct)))) as executor:
+        errors = dict(zip(distinct, executor.map(check_site, distinct)))
+    return {url: error for url, error in errors.items() if error}
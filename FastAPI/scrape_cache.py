@@ -0,0 +1,153 @@
+# scrape_cache.py
+"""
+Persistent per-site cache of scrape results.
+
+Keyed by the website's URL (scraper.urls.url_key, so scheme, www and a
+trailing slash don't matter, but the path does: pages on shared hosts like
+facebook.com/<page> or sites.google.com/view/<site> are different sites)
+and by crawl depth.  A lookup is served by a result crawled at least as
+deep as requested.
+
+Successful crawls (at least one email) are kept for SCRAPE_CACHE_HIT_TTL
+seconds.  Failures that say something about the site itself — timeouts,
+dead domains, "No Email Found" — are cached too, with a back-off that
+doubles on every consecutive failure, starting at SCRAPE_CACHE_MISS_TTL and
+capped at SCRAPE_CACHE_MAX_BACKOFF.  Worker errors, crashes and refusals
+are infrastructure trouble and never cached.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import closing, contextmanager
+from typing import Iterator
+from scraper.urls import url_key
+
+CACHE_PATH = os.getenv("SCRAPE_CACHE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "scrape_cache.sqlite3"))
+HIT_TTL = int(os.getenv("SCRAPE_CACHE_HIT_TTL", str(7 * 24 * 3600)))
+MISS_TTL = int(os.getenv("SCRAPE_CACHE_MISS_TTL", str(6 * 3600)))
+MAX_BACKOFF = int(os.getenv("SCRAPE_CACHE_MAX_BACKOFF", str(7 * 24 * 3600)))
+
+# Depth recorded for site-level outcomes (dead domains), which hold for a
+# crawl of any depth
+ALL_DEPTHS = 99
+# Result statuses that say something about the site (see scraper_pool.scrape);
+# "dead" is a failed preflight check
+SITE_STATUSES = {"ok", "deadline", "timeout", "dead"}
+
+
+def cache_key(url: str) -> str:
+    """'HTTPS://www.Example.com:443/contact/' → 'example.com/contact'"""
+    url = url.strip()
+    if "://" not in url:
+        url = f"http://{url}"
+    key = url_key(url)
+    return "" if key.startswith("/") else key  # no host
+
+
+class ScrapeCache:
+    def __init__(self, path: str = CACHE_PATH) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS scrape_results (
+                    key         TEXT NOT NULL,
+                    depth       INTEGER NOT NULL,
+                    status      TEXT NOT NULL,
+                    emails      TEXT NOT NULL,
+                    spa         INTEGER,
+                    crawled_at  REAL NOT NULL,
+                    failure     TEXT NOT NULL DEFAULT '',
+                    failures    INTEGER NOT NULL DEFAULT 0,
+                    expires_at  REAL NOT NULL,
+                    PRIMARY KEY (key, depth)
+                )
+                """
+            )
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        """A connection that is committed (or rolled back) and closed on exit."""
+        with closing(sqlite3.connect(self.path, timeout=10)) as conn, conn:
+            yield conn
+
+    def get(self, url: str, depth: int = 0) -> dict | None:
+        """
+        Freshest cached result for url crawled at least `depth` deep, or
+        None if there is none.
+        """
+        key = cache_key(url)
+        if not key:
+            return None
+        with self._lock, self._connect() as conn:
+            row = conn.execute(
+                """
+                SELECT status, emails, spa, crawled_at, failure FROM scrape_results
+                WHERE key = ? AND depth >= ? AND expires_at >= ?
+                ORDER BY crawled_at DESC LIMIT 1
+                """,
+                (key, depth, time.time()),
+            ).fetchone()
+        if row is None:
+            return None
+        status, emails, spa, crawled_at, failure = row
+        return {
+            "status": status,
+            "emails": json.loads(emails),
+            "spa": None if spa is None else bool(spa),
+            "crawled_at": crawled_at,
+            "error": failure,
+            "cached": True,
+        }
+
+    def put(self, url: str, result: dict, depth: int = ALL_DEPTHS) -> None:
+        """
+        Store a scraper_pool result for a crawl of the given depth; failures
+        extend the back-off.  Results whose status says nothing about the
+        site (error, crashed, refused) are ignored.
+        """
+        key = cache_key(url)
+        if not key or result.get("status", "ok") not in SITE_STATUSES:
+            return
+        now = time.time()
+        emails = result.get("emails", [])
+        spa = result.get("spa")
+
+        with self._lock, self._connect() as conn:
+            if emails:
+                failure, failures, expires_at = "", 0, now + HIT_TTL
+            else:
+                row = conn.execute(
+                    "SELECT failures FROM scrape_results WHERE key = ? AND depth = ?", (key, depth)
+                ).fetchone()
+                failures = (row[0] if row else 0) + 1
+                failure = result.get("error") or (
+                    "Timeout" if result.get("status") in ("timeout", "deadline") else "No Email Found"
+                )
+                expires_at = now + min(MISS_TTL * 2 ** (failures - 1), MAX_BACKOFF)
+
+            conn.execute(
+                """
+                INSERT OR REPLACE INTO scrape_results
+                    (key, depth, status, emails, spa, crawled_at, failure, failures, expires_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (
+                    key,
+                    depth,
+                    result.get("status", "ok"),
+                    json.dumps(emails),
+                    None if spa is None else int(spa),
+                    now,
+                    failure,
+                    failures,
+                    expires_at,
+                ),
+            )
+
+
+cache = ScrapeCache()
@@ -0,0 +1,138 @@
+# scrape_jobs.py
+"""
+In-memory store for asynchronous scrape jobs.
+
+A job is a list of (place_id, url) pairs scraped in the background on the
+shared worker pool.  Callers submit, poll status, page through results and
+can cancel; job state lives in the service process and outlives the request
+that created it.  Finished jobs are dropped after JOB_TTL seconds.
+"""
+
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
+JOB_TTL = int(os.getenv("SCRAPE_JOB_TTL", "3600"))
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+CANCELLED = "cancelled"
+FAILED = "failed"
+
+
+class ScrapeJob:
+    def __init__(self, places: list[tuple[str, str]], concurrency: int, options: dict) -> None:
+        self.id = uuid.uuid4().hex
+        self.places = places
+        self.concurrency = max(1, concurrency)
+        # Extra keyword arguments for every scrape call (e.g. refresh)
+        self.options = options
+        self.status = QUEUED
+        self.error = ""
+        # One slot per place, in input order; None until that place is scraped
+        self.results: list[dict | None] = [None] * len(places)
+        self.done = 0
+        self.emails_found = 0
+        self.created_at = time.time()
+        self.finished_at: float | None = None
+        self.cancelled = threading.Event()
+        self._lock = threading.Lock()
+
+    def record(self, index: int, result: dict) -> None:
+        with self._lock:
+            self.results[index] = result
+            self.done += 1
+            self.emails_found += len(result.get("emails", []))
+
+    def finish(self, status: str, error: str = "") -> None:
+        self.status = status
+        self.error = error
+        self.finished_at = time.time()
+
+    def summary(self) -> dict:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "total": len(self.places),
+            "done": self.done,
+            "emails_found": self.emails_found,
+            "error": self.error,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+        }
+
+    def page(self, offset: int, limit: int) -> dict:
+        """
+        Finished results from offset in input order, stopping at the first
+        place still in flight so that paging while the job runs never skips.
+        """
+        items = []
+        for result in self.results[offset:offset + limit]:
+            if result is None:
+                break
+            items.append(result)
+        next_offset = offset + len(items)
+        return {
+            **self.summary(),
+            "offset": offset,
+            "results": items,
+            "next_offset": next_offset if next_offset < len(self.places) else None,
+        }
+
+
+class ScrapeJobStore:
+    def __init__(self, scrape: Callable[[str, str], dict]) -> None:
+        """`scrape(place_id, url, **options)` returns {"place_id", "emails", ["scrape_error"]}."""
+        self._scrape = scrape
+        self._jobs: dict[str, ScrapeJob] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, places: list[tuple[str, str]], concurrency: int, **options) -> ScrapeJob:
+        job = ScrapeJob(places, concurrency, options)
+        with self._lock:
+            self._expire()
+            self._jobs[job.id] = job
+        threading.Thread(target=self._run, args=(job,), daemon=True).start()
+        return job
+
+    def get(self, job_id: str) -> ScrapeJob | None:
+        with self._lock:
+            self._expire()
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> ScrapeJob | None:
+        job = self.get(job_id)
+        if job is not None:
+            job.cancelled.set()
+        return job
+
+    def _expire(self) -> None:
+        cutoff = time.time() - JOB_TTL
+        for job_id, job in list(self._jobs.items()):
+            if job.finished_at is not None and job.finished_at < cutoff:
+                del self._jobs[job_id]
+
+    def _run(self, job: ScrapeJob) -> None:
+        job.status = RUNNING
+
+        def _one(index: int) -> None:
+            place_id, url = job.places[index]
+            if job.cancelled.is_set():
+                job.record(index, {"place_id": place_id, "emails": [], "scrape_error": "Cancelled"})
+                return
+            job.record(index, self._scrape(place_id, url, **job.options))
+
+        try:
+            with ThreadPoolExecutor(max_workers=job.concurrency) as executor:
+                futures = [executor.submit(_one, i) for i in range(len(job.places))]
+                for future in futures:
+                    future.result()
+        except Exception as e:
+            job.finish(FAILED, str(e))
+            return
+
+        job.finish(CANCELLED if job.cancelled.is_set() else DONE)
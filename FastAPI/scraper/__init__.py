@@ -1,24 +1,53 @@
-from .email_extractor import extract_emails_recursive
+from .email_extractor import extract_emails_recursive, fetch_page
+from .http_client import get_session
 import asyncio
-from .spa_email_extractor import spa_extract_emails_recursive
-from .utils import is_spa_site
+from .spa_email_extractor import DEFAULT_WAIT_STRATEGY, spa_extract_emails_recursive
+from .bundle_scan import scan_script_bundles
+from .cms import run_cms_stage
+from .browser_pool import MemoryPressure
+from .crawl_state import CrawlState
+from .deadline import Deadline
+from .utils import is_spa_soup
 
 
-async def scrape_email(URL:str, depth:int=2, tmp_file="temp_file.txt", debug=False):
-    emails =[]
-    if URL and is_spa_site(URL):
-        if debug:
-            print("SPA Website detected, Launching SPA scraper")
-        emails =await spa_extract_emails_recursive(URL, depth,tmp_file=tmp_file,debug=debug)
-    else:
-        if debug:
-            print("Static Website detected, Launching Legacy scraper")
+async def scrape_email(URL:str, depth:int=2, debug=False, deadline=None):
+    result = await scrape_site(URL, depth, debug=debug, deadline=deadline)
+    return result["emails"]
 
-        emails = extract_emails_recursive(URL,depth, debug = debug)
-        # if no emails found from static site scrapper attempt the spa
 
-        if not emails:
-            emails =await spa_extract_emails_recursive(URL, depth, tmp_file=tmp_file, debug=debug)
+async def scrape_site(URL:str, depth:int=2, debug=False, on_progress=None, strategy=None, wait_strategy=None, deadline=None) -> dict:
+    """
+    Same crawl as scrape_email, but returns a report:
+      {"emails": [...], "spa": <is_spa_site classification>,
+       "tier": <tier that yielded the first on-domain email, or None>,
+       "duplicates_skipped": <pages skipped as duplicate content>,
+       "spa_wait": {"strategy", "pages", "total_ms", "avg_ms", "max_ms"},
+       "stage": <"cms", "static", "bundle" or "spa" — the stage that found
+                 the emails, None if none did>,
+       "cms": {"name", "emails", "ms"} for a recognized platform, else None,
+       "deadline_reached": <True when the budget ran out and emails are partial>,
+       "memory_capped": <True when Chromium's memory ceiling cut the SPA crawl short>,
+       "spa_refused": <True when memory was too tight to run the SPA crawler>}
+    Stages run cheapest first: the platform extractor for recognized CMSs,
+    the static crawler (skipped for SPA sites), a scan of the homepage's
+    script bundles, then Chromium.
+    on_progress, if given, is called after every visited page with
+      {"emails": <newly found>, "pages": <visited so far>, "depth": <depth>,
+       "tier": <tier>, "duplicates_skipped": <so far>}
+    strategy is "tiered" (stop after the first tier with an on-domain email)
+    or "full"; defaults to CRAWL_STRATEGY.  wait_strategy is how the SPA
+    crawler waits for pages to render, "adaptive" or "networkidle";
+    defaults to SPA_WAIT_STRATEGY.
+    deadline (a Deadline, or seconds) bounds the whole scrape: stages and
+    fetches are cut short once it passes, and whatever was found by then
+    is returned.  None means no budget.
+    """
+    wait_strategy = wait_strategy or DEFAULT_WAIT_STRATEGY
+    if not isinstance(deadline, Deadline):
+        deadline = Deadline(deadline)
+    state = CrawlState(on_progress, site_url=URL, strategy=strategy, deadline=deadline)
+    with deadline.active():
+        emails, spa, stage, cms = await _run_stages(URL, depth, debug, state, wait_strategy)
 
     if emails and debug:
         print(f"\nFound {len(emails)} email(s):")
@@ -27,8 +56,85 @@ async def scrape_email(URL:str, depth:int=2, tmp_file="temp_file.txt", debug=Fal
     else:
         if debug:
             print("No emails found.")
+    if deadline.reached and debug:
+        print("Deadline reached, results are partial")
 
-    return emails
+    return {
+        "emails": emails,
+        "spa": spa,
+        "tier": state.found_tier,
+        "duplicates_skipped": state.duplicates_skipped,
+        "spa_wait": {"strategy": wait_strategy, **state.wait_report()},
+        "stage": stage,
+        "cms": cms,
+        "deadline_reached": deadline.reached,
+        "memory_capped": state.memory_capped,
+        "spa_refused": state.spa_refused,
+    }
+
+
+async def _run_stages(URL: str, depth: int, debug, state: CrawlState, wait_strategy: str):
+    """scrape_site's stages; returns (emails, spa, stage, cms)."""
+    deadline = state.deadline
+    emails =[]
+    # Fetch and parse the homepage once: the same response drives SPA
+    # classification and the static crawler's first page.
+    session = get_session()
+    homepage = await asyncio.to_thread(fetch_page, URL, session, debug=debug) if URL else None
+    if homepage is None:
+        spa = False  # unreachable → default to the static scraper
+    elif not homepage.ok:
+        spa = True  # fallback: try SPA scraper on error
+    else:
+        spa = is_spa_soup(homepage.soup)
 
+    stage = None
+    cms = None
+    if homepage is not None and homepage.ok and not deadline.expired():
+        cms = await asyncio.to_thread(run_cms_stage, homepage, session)
+        if cms is not None:
+            if debug:
+                print(f"{cms['name']} site detected, {len(cms['emails'])} email(s) in {cms['ms']} ms")
+            state.tier = 2
+            state.add_page(set(cms["emails"]), 0)
+            if cms["emails"]:
+                emails = cms["emails"]
+                stage = "cms"
 
+    if emails or deadline.expired():
+        pass  # the platform extractor was enough, or there's no time left
+    elif spa:
+        if debug:
+            print("SPA Website detected, skipping the static scraper")
+    else:
+        if debug:
+            print("Static Website detected, Launching Legacy scraper")
+
+        emails = await extract_emails_recursive(URL,depth, debug = debug, session=session, homepage=homepage, state=state)
+        if emails:
+            stage = "static"
+
+    # Cheap middle stage: emails and contact routes inside the site's scripts
+    bundle_routes = set()
+    if not emails and homepage is not None and homepage.ok and not deadline.expired():
+        emails, bundle_routes = await scan_script_bundles(URL, homepage, session, state, debug=debug)
+        if emails:
+            stage = "bundle"
+
+    # Last resort: render the site in Chromium
+    if not emails and not deadline.expired():
+        if debug:
+            print("Launching SPA scraper")
+        try:
+            emails =await spa_extract_emails_recursive(
+                URL, depth, debug=debug, state=state,
+                wait_strategy=wait_strategy, extra_links=bundle_routes,
+            )
+        except MemoryPressure as e:
+            if debug:
+                print(f"SPA scraper refused: {e}")
+            state.spa_refused = True
+        if emails:
+            stage = "spa"
 
+    return emails, spa, stage, cms
@@ -0,0 +1,219 @@
+"""
+Process-wide Chromium pool for the SPA extractor.
+
+Launching Chromium costs seconds and hundreds of MB, so one browser is kept up
+for the life of the worker process and every site gets a fresh, isolated
+BrowserContext from it.  The pool caps concurrent contexts, recycles the
+browser after a number of page visits and relaunches it when it stops
+responding.
+
+It also watches memory (see scraper.memory).  Chromium is recycled once
+its processes' RSS passes MAX_BROWSER_RSS_MB.  A context is over its
+ceiling once Chromium has grown MAX_CONTEXT_RSS_MB since the context
+opened; the SPA crawler then swaps its tab for a fresh one, and stops
+crawling the site if that doesn't help.  No new context is opened while
+less than MIN_FREE_MB is available: context() raises MemoryPressure.
+"""
+
+import asyncio
+import os
+from collections import Counter
+from contextlib import asynccontextmanager
+from playwright.async_api import async_playwright, Browser, BrowserContext
+from scraper import memory
+
+MAX_CONTEXTS = int(os.getenv("SPA_MAX_CONTEXTS", "2"))
+# Relaunch Chromium after this many page visits to shed leaked renderer memory
+MAX_PAGES_PER_BROWSER = int(os.getenv("SPA_BROWSER_MAX_PAGES", "200"))
+# Swap a crawl's tab for a fresh one after this many page visits
+MAX_PAGES_PER_CONTEXT = int(os.getenv("SPA_CONTEXT_MAX_PAGES", "25"))
+# Relaunch Chromium once its processes (and Playwright's driver) use this much
+MAX_BROWSER_RSS_MB = int(os.getenv("SPA_BROWSER_MAX_RSS_MB", "1536"))
+# Growth of Chromium's RSS one context may cause before it is reined in
+MAX_CONTEXT_RSS_MB = int(os.getenv("SPA_CONTEXT_MAX_RSS_MB", "512"))
+# Refuse new contexts while less than this is available to the container
+MIN_FREE_MB = int(os.getenv("SPA_MIN_FREE_MB", "512"))
+
+LAUNCH_ARGS = [
+    "--disable-blink-features=AutomationControlled",
+    "--disable-dev-shm-usage",
+    "--disable-gpu",
+    "--no-sandbox",
+    "--ignore-certificate-errors",
+    "--allow-insecure-localhost",
+]
+
+
+class MemoryPressure(RuntimeError):
+    """Raised instead of opening a context while memory is tight."""
+
+
+class BrowserPool:
+    def __init__(self, max_contexts: int = MAX_CONTEXTS, max_pages: int = MAX_PAGES_PER_BROWSER) -> None:
+        self.max_pages = max_pages
+        self.loop = asyncio.get_running_loop()
+        self._slots = asyncio.Semaphore(max(1, max_contexts))
+        self._lock = asyncio.Lock()
+        self._playwright = None
+        self._browser: Browser | None = None
+        self._pages = 0
+        # Open contexts per browser, so retired browsers close once drained
+        self._active: dict[Browser, int] = {}
+        self.launches = 0
+        # Chromium's RSS when each open context was created
+        self._baselines: dict[BrowserContext, int] = {}
+        # Set when a context went over its ceiling: relaunch at the next chance
+        self._recycle = False
+        # Recycles and refusals since the last take_counts()
+        self.counts: Counter = Counter()
+
+    async def _healthy(self, browser: Browser) -> bool:
+        try:
+            return browser.is_connected() and bool(browser.version)
+        except Exception:
+            return False
+
+    async def _retire(self, browser: Browser) -> None:
+        """Close browser now if idle, otherwise when its last context closes."""
+        if self._browser is browser:
+            self._browser = None
+        if not self._active.get(browser):
+            self._active.pop(browser, None)
+            try:
+                await browser.close()
+            except Exception:
+                pass
+
+    def browser_rss(self) -> int:
+        """Bytes used by Chromium and Playwright's driver (this process's children)."""
+        if self._playwright is None:
+            return 0
+        return memory.tree_rss(os.getpid(), include_self=False)
+
+    def memory_tight(self) -> bool:
+        free = memory.available()
+        return free is not None and free < MIN_FREE_MB * memory.MB
+
+    def over_limit(self, ctx: BrowserContext) -> bool:
+        """True once Chromium has grown past MAX_CONTEXT_RSS_MB since ctx opened."""
+        baseline = self._baselines.get(ctx)
+        if baseline is None:
+            return False
+        return self.browser_rss() - baseline > MAX_CONTEXT_RSS_MB * memory.MB
+
+    def recycle_soon(self) -> None:
+        """Relaunch Chromium before the next context, as soon as it drains."""
+        self._recycle = True
+
+    def _recycle_reason(self) -> str | None:
+        if self._pages >= self.max_pages:
+            return "pages"
+        if self._recycle or self.browser_rss() > MAX_BROWSER_RSS_MB * memory.MB:
+            return "memory"
+        return None
+
+    async def _get_browser(self) -> Browser:
+        async with self._lock:
+            if self._browser is not None:
+                reason = "unhealthy" if not await self._healthy(self._browser) else self._recycle_reason()
+                if reason is not None:
+                    self.counts[f"browser_recycled_{reason}"] += 1
+                    await self._retire(self._browser)
+
+            if self._browser is None:
+                if self._playwright is None:
+                    self._playwright = await async_playwright().start()
+                self._browser = await self._playwright.chromium.launch(headless=True, args=LAUNCH_ARGS)
+                self._active[self._browser] = 0
+                self._pages = 0
+                self._recycle = False
+                self.launches += 1
+
+            return self._browser
+
+    def count_page(self) -> None:
+        """Called by crawlers once per navigation; drives browser recycling."""
+        self._pages += 1
+
+    def take_counts(self) -> dict:
+        """Recycle and refusal counts since the previous call."""
+        counts, self.counts = dict(self.counts), Counter()
+        return counts
+
+    @asynccontextmanager
+    async def context(self, **kwargs):
+        """
+        Yield a fresh BrowserContext, waiting for a free slot first.  Raises
+        MemoryPressure instead when memory is tight.
+        """
+        async with self._slots:
+            if self.memory_tight():
+                self.counts["spa_refused"] += 1
+                raise MemoryPressure(f"less than {MIN_FREE_MB} MB available, not opening a browser context")
+            browser = await self._get_browser()
+            try:
+                ctx: BrowserContext = await browser.new_context(**kwargs)
+            except Exception:
+                # Browser died between the health check and now — relaunch once
+                async with self._lock:
+                    await self._retire(browser)
+                browser = await self._get_browser()
+                ctx = await browser.new_context(**kwargs)
+
+            self._active[browser] = self._active.get(browser, 0) + 1
+            self._baselines[ctx] = self.browser_rss()
+            try:
+                yield ctx
+            finally:
+                self._baselines.pop(ctx, None)
+                try:
+                    await ctx.close()
+                except Exception:
+                    pass
+                self._active[browser] -= 1
+                if browser is not self._browser:
+                    async with self._lock:
+                        await self._retire(browser)
+
+    async def close(self) -> None:
+        async with self._lock:
+            for browser in list(self._active):
+                try:
+                    await browser.close()
+                except Exception:
+                    pass
+            self._active.clear()
+            self._browser = None
+            if self._playwright is not None:
+                await self._playwright.stop()
+                self._playwright = None
+
+
+_pool: BrowserPool | None = None
+
+
+def get_browser_pool() -> BrowserPool:
+    """The pool for the running event loop, created on first use."""
+    global _pool
+    if _pool is None or _pool.loop is not asyncio.get_running_loop():
+        _pool = BrowserPool()
+    return _pool
+
+
+def memory_report() -> dict:
+    """
+    This worker's memory and the browser pool's counts since the last
+    report, for the scraper pool's stats (see scraper_worker).
+    """
+    report = {"rss": memory.rss(), "browser_rss": 0, "counts": {}}
+    if _pool is not None:
+        report["browser_rss"] = _pool.browser_rss()
+        report["counts"] = _pool.take_counts()
+    return report
+
+
+async def close_browser_pool() -> None:
+    global _pool
+    if _pool is not None and _pool.loop is asyncio.get_running_loop():
+        await _pool.close()
+    _pool = None
@@ -0,0 +1,118 @@
+"""
+JS bundle scan — the stage between the static crawler and Chromium.
+
+Client-rendered sites often ship their contact details, or at least their
+route table, inside same-origin script bundles.  Downloading and regexing
+those is far cheaper than launching a browser, so scrape_site tries this
+before escalating.  Besides emails it returns contact-like route paths
+found in the scripts, which the static pass fetches and the SPA crawler
+can use as extra seeds.
+"""
+
+import asyncio
+import os
+import re
+import requests
+from urllib.parse import urljoin, urlparse
+from scraper.crawl_state import CrawlState
+from scraper.email_extractor import FetchedPage, extract_page, fetch_page, read_body
+from scraper.html_extract import emails_in_text
+from scraper.utils import PRIORITY_KEYWORDS, is_same_domain
+
+MAX_BUNDLES = int(os.getenv("BUNDLE_SCAN_MAX_SCRIPTS", "10"))
+MAX_BUNDLE_BYTES = int(os.getenv("BUNDLE_SCAN_MAX_BYTES", str(2 * 1024 * 1024)))
+MAX_ROUTES = int(os.getenv("BUNDLE_SCAN_MAX_ROUTES", "5"))
+
+# Quoted absolute paths that mention a contact-page keyword, e.g. "/contact-us"
+_ROUTE_RE = re.compile(
+    r"""["'`](/[a-z0-9/_-]*(?:%s)[a-z0-9/_-]*)["'`]"""
+    % "|".join(re.escape(k) for k in PRIORITY_KEYWORDS),
+    re.I,
+)
+
+
+def script_sources(homepage: FetchedPage) -> tuple[list[str], list[str]]:
+    """(same-origin script URLs, inline script bodies) of a fetched page."""
+    urls: list[str] = []
+    inline: list[str] = []
+    for script in homepage.soup.find_all("script"):
+        src = script.get("src")
+        if src:
+            url = urljoin(homepage.final_url, src)
+            if is_same_domain(homepage.final_url, url) and url not in urls:
+                urls.append(url)
+        elif script.string and script.get("type") != "application/ld+json":
+            inline.append(script.string)
+    return urls[:MAX_BUNDLES], inline
+
+
+def _download(url: str, session: requests.Session) -> str:
+    """Body of url, truncated at MAX_BUNDLE_BYTES; "" on any failure."""
+    try:
+        with session.get(url, timeout=15, stream=True) as r:
+            if not r.ok:
+                return ""
+            return read_body(r, MAX_BUNDLE_BYTES)[0]
+    except requests.RequestException:
+        return ""
+
+
+def routes_in_script(source: str) -> set[str]:
+    """
+    Contact-like paths named in a script, as written: the keyword match
+    ignores case, but paths are case-sensitive on many servers.
+    """
+    return {m for m in _ROUTE_RE.findall(source) if len(m) > 1}
+
+
+async def scan_script_bundles(
+    start_url: str,
+    homepage: FetchedPage,
+    session: requests.Session,
+    state: CrawlState,
+    debug=False,
+) -> tuple[list[str], set[str]]:
+    """
+    Emails from the homepage's scripts and from contact routes they name,
+    plus those routes as absolute URLs.
+    """
+    bundle_urls, inline = script_sources(homepage)
+    if debug:
+        print(f"[INFO] Scanning {len(bundle_urls)} script bundles, {len(inline)} inline scripts")
+
+    bundles = await asyncio.gather(*(
+        asyncio.to_thread(_download, url, session) for url in bundle_urls
+    ))
+
+    state.tier = 1  # homepage assets
+    emails: set[str] = set()
+    routes: set[str] = set()
+    for source in [*inline, *bundles]:
+        if not source:
+            continue
+        found = emails_in_text(source)
+        emails |= found
+        routes |= routes_in_script(source)
+        state.add_page(found, 0)
+
+    base = homepage.final_url
+    route_urls = {urljoin(base, path) for path in routes}
+    route_urls.discard(base)
+    if debug and route_urls:
+        print(f"[INFO] Bundles name {len(route_urls)} contact routes")
+
+    # Server-rendered route pages may carry the email without any JS
+    if not emails and route_urls:
+        state.tier = 2
+        to_fetch = sorted(route_urls, key=lambda u: len(urlparse(u).path))[:MAX_ROUTES]
+        pages = await asyncio.gather(*(
+            asyncio.to_thread(fetch_page, url, session, debug=debug) for url in to_fetch
+        ))
+        for page in pages:
+            if page is None or (page.ok and state.is_duplicate(page.fingerprint)):
+                continue
+            found, _ = await asyncio.to_thread(extract_page, page, debug)
+            emails |= found
+            state.add_page(found, 1)
+
+    return sorted(emails), route_urls
@@ -0,0 +1,188 @@
+"""
+CMS fingerprinting and platform-specific extractors.
+
+Many small-business sites run on a handful of site builders whose
+contact details are reachable through predictable, cheap endpoints.  The
+homepage response identifies the platform, and the matching extractor
+tries those endpoints over plain HTTP before any crawling or browser:
+  wordpress   – /wp-json/ pages REST API searched for contact/about pages
+  shopify     – /pages/contact, /policies/contact-information, /meta.json
+  wix         – site data embedded in the page, plus /contact
+  squarespace – ?format=json for the homepage and contact pages
+CmsStats aggregates per-platform hit rates and timings.
+"""
+
+import json
+import re
+import threading
+import time
+import requests
+from bs4 import BeautifulSoup
+from urllib.parse import urljoin
+from scraper.email_extractor import FetchedPage, extract_page, fetch_page, read_body
+from scraper.html_extract import emails_in_text, extract_emails_and_links
+from scraper.utils import HTML_PARSER
+
+WORDPRESS = "wordpress"
+SHOPIFY = "shopify"
+WIX = "wix"
+SQUARESPACE = "squarespace"
+
+# Substrings of the homepage HTML that give each platform away
+_FINGERPRINTS = {
+    WORDPRESS: ("/wp-content/", "/wp-includes/", "/wp-json/", 'content="WordPress'),
+    SHOPIFY: ("cdn.shopify.com", "Shopify.shop", "myshopify.com"),
+    WIX: ("static.parastorage.com", "wixstatic.com", 'content="Wix.com'),
+    SQUARESPACE: ("static1.squarespace.com", "Static.SQUARESPACE_CONTEXT", "<!-- This is Squarespace. -->"),
+}
+
+_JSON_SCRIPT_RE = re.compile(r"<script[^>]*type=[\"']application/json[\"'][^>]*>(.*?)</script>", re.S | re.I)
+
+
+def detect_cms(homepage: FetchedPage) -> str | None:
+    if not homepage.ok:
+        return None
+    html = homepage.html
+    for cms, markers in _FINGERPRINTS.items():
+        if any(marker in html for marker in markers):
+            return cms
+    return None
+
+
+def _json_emails(raw: str) -> set[str]:
+    # JSON often escapes "@" as \u0040 and "/" as \/
+    return emails_in_text(raw.replace("\\u0040", "@").replace("\\/", "/"))
+
+
+def _page_emails(url: str, session: requests.Session) -> set[str]:
+    emails, _ = extract_page(fetch_page(url, session, timeout=10))
+    return emails
+
+
+def _get_json(url: str, session: requests.Session) -> str:
+    """Body of a JSON endpoint (at most MAX_PAGE_BYTES), or "" if it isn't one."""
+    try:
+        with session.get(url, timeout=10, stream=True) as r:
+            if not r.ok or "json" not in r.headers.get("content-type", ""):
+                return ""
+            return read_body(r)[0]
+    except requests.RequestException:
+        return ""
+
+
+def _wordpress(base_url: str, homepage: FetchedPage, session: requests.Session) -> set[str]:
+    emails: set[str] = set()
+    for term in ("contact", "about"):
+        raw = _get_json(
+            urljoin(base_url, f"/wp-json/wp/v2/pages?search={term}&per_page=5&_fields=link,content"),
+            session,
+        )
+        if not raw:
+            break  # REST API disabled — the other search won't work either
+        try:
+            pages = json.loads(raw)
+        except ValueError:
+            break
+        for page in pages if isinstance(pages, list) else []:
+            rendered = (page.get("content") or {}).get("rendered") or ""
+            # Rendered content includes contact-form plugin markup as well
+            found, _ = extract_emails_and_links(BeautifulSoup(rendered, HTML_PARSER), base_url)
+            emails |= found
+        if emails:
+            break
+    return emails
+
+
+def _shopify(base_url: str, homepage: FetchedPage, session: requests.Session) -> set[str]:
+    emails: set[str] = set()
+    for path in ("/pages/contact", "/policies/contact-information"):
+        emails |= _page_emails(urljoin(base_url, path), session)
+        if emails:
+            return emails
+    return _json_emails(_get_json(urljoin(base_url, "/meta.json"), session))
+
+
+def _wix(base_url: str, homepage: FetchedPage, session: requests.Session) -> set[str]:
+    emails: set[str] = set()
+    for raw in _JSON_SCRIPT_RE.findall(homepage.html):
+        emails |= _json_emails(raw)
+    if emails:
+        return emails
+    for path in ("/contact", "/contact-us"):
+        page = fetch_page(urljoin(base_url, path), session, timeout=10)
+        if page is None or not page.ok:
+            continue
+        for raw in _JSON_SCRIPT_RE.findall(page.html):
+            emails |= _json_emails(raw)
+        emails |= extract_page(page)[0]
+        if emails:
+            break
+    return emails
+
+
+def _squarespace(base_url: str, homepage: FetchedPage, session: requests.Session) -> set[str]:
+    emails: set[str] = set()
+    for path in ("/", "/contact", "/contact-us"):
+        emails |= _json_emails(_get_json(urljoin(base_url, path) + "?format=json", session))
+        if emails:
+            break
+    return emails
+
+
+_EXTRACTORS = {
+    WORDPRESS: _wordpress,
+    SHOPIFY: _shopify,
+    WIX: _wix,
+    SQUARESPACE: _squarespace,
+}
+
+
+def extract_cms_emails(cms: str, homepage: FetchedPage, session: requests.Session) -> set[str]:
+    """Run the platform extractor for cms against the site of homepage."""
+    try:
+        return _EXTRACTORS[cms](homepage.final_url, homepage, session)
+    except Exception:
+        return set()
+
+
+class CmsStats:
+    """Per-platform attempts, hits and time spent, across scrapes."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._stats: dict[str, dict] = {}
+
+    def record(self, cms: str, hit: bool, seconds: float) -> None:
+        with self._lock:
+            s = self._stats.setdefault(cms, {"attempts": 0, "hits": 0, "seconds": 0.0})
+            s["attempts"] += 1
+            s["hits"] += int(hit)
+            s["seconds"] += seconds
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                cms: {
+                    "attempts": s["attempts"],
+                    "hits": s["hits"],
+                    "hit_rate": round(s["hits"] / s["attempts"], 3),
+                    "avg_ms": round(s["seconds"] * 1000 / s["attempts"]),
+                }
+                for cms, s in self._stats.items()
+            }
+
+
+cms_stats = CmsStats()
+
+
+def run_cms_stage(homepage: FetchedPage, session: requests.Session) -> dict | None:
+    """
+    Detect the platform and run its extractor.  Returns
+    {"name", "emails", "ms"} or None for unrecognized sites.
+    """
+    cms = detect_cms(homepage)
+    if cms is None:
+        return None
+    started = time.monotonic()
+    emails = extract_cms_emails(cms, homepage, session)
+    return {"name": cms, "emails": sorted(emails), "ms": round((time.monotonic() - started) * 1000)}
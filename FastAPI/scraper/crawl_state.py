@@ -0,0 +1,114 @@
+"""
+In-memory progress of one site's crawl, shared by every crawler stage.
+
+Crawlers report each visited page here instead of rewriting a temp file;
+the optional on_progress callback receives only what is new, so the caller
+(e.g. the pooled worker) can stream discoveries and keep partial results if
+the crawl is cut short.
+
+The state also carries the crawl strategy.  With the tiered strategy the
+crawlers visit pages in tiers and stop after the first tier that yields an
+email on the business's own domain:
+  tier 1 – homepage (+ sitemap contact pages for the static crawler)
+  tier 2 – priority links (contact, about, …) found on tier 1
+  tier 3 – everything else, down to max_depth
+The full strategy always crawls to max_depth.
+
+Pages whose content fingerprint matches a page already seen in the same
+crawl (soft 404s serving the homepage, the same page under several URLs)
+are counted in duplicates_skipped and not extracted again.
+
+Every stage also checks the state's deadline (see scraper.deadline) and
+stops scheduling pages once the site's time budget is spent.
+"""
+
+import os
+from typing import Callable
+from scraper.deadline import Deadline
+from scraper.utils import is_on_domain_email
+
+TIERED = "tiered"
+FULL = "full"
+DEFAULT_STRATEGY = os.getenv("CRAWL_STRATEGY", TIERED)
+
+
+class CrawlState:
+    def __init__(
+        self,
+        on_progress: Callable[[dict], None] | None = None,
+        site_url: str = "",
+        strategy: str | None = None,
+        deadline: Deadline | None = None,
+    ) -> None:
+        self.emails: set[str] = set()
+        self.pages = 0
+        self.depth = 0
+        self.on_progress = on_progress
+        self.site_url = site_url
+        self.strategy = strategy or DEFAULT_STRATEGY
+        # Tier currently being crawled, and the one that produced the first
+        # on-domain email (None until one is found)
+        self.tier = 1
+        self.found_tier: int | None = None
+        # Content fingerprints seen so far, per crawler ("static" pages are
+        # raw HTML, "spa" pages the rendered DOM, so they never compare)
+        self.fingerprints: set[tuple[str, str]] = set()
+        self.duplicates_skipped = 0
+        # Seconds the SPA crawler waited for each rendered page
+        self.waits: list[float] = []
+        self.deadline = deadline or Deadline()
+        # The SPA stage stopped early because its browser context went over
+        # its memory ceiling, or was refused because memory was tight
+        self.memory_capped = False
+        self.spa_refused = False
+
+    @property
+    def tiered(self) -> bool:
+        return self.strategy == TIERED
+
+    def should_stop(self) -> bool:
+        """True once a finished tier has produced an on-domain email."""
+        return self.tiered and self.found_tier is not None
+
+    def is_duplicate(self, fingerprint: str, scope: str = "static") -> bool:
+        """Record a page's fingerprint; True if the same content was seen before."""
+        if not fingerprint:
+            return False
+        key = (scope, fingerprint)
+        if key in self.fingerprints:
+            self.duplicates_skipped += 1
+            return True
+        self.fingerprints.add(key)
+        return False
+
+    def add_wait(self, seconds: float) -> None:
+        self.waits.append(seconds)
+
+    def wait_report(self) -> dict:
+        """Summary of the SPA crawler's page-readiness waits, in ms."""
+        total = sum(self.waits)
+        return {
+            "pages": len(self.waits),
+            "total_ms": round(total * 1000),
+            "avg_ms": round(total * 1000 / len(self.waits)) if self.waits else 0,
+            "max_ms": round(max(self.waits, default=0) * 1000),
+        }
+
+    def add_page(self, emails: set[str], depth: int) -> None:
+        """Record one visited page and report any newly found emails."""
+        new = emails - self.emails
+        self.emails |= new
+        self.pages += 1
+        self.depth = depth
+        if self.found_tier is None and self.site_url and any(
+            is_on_domain_email(e, self.site_url) for e in new
+        ):
+            self.found_tier = self.tier
+        if self.on_progress is not None:
+            self.on_progress({
+                "emails": sorted(new),
+                "pages": self.pages,
+                "depth": depth,
+                "tier": self.tier,
+                "duplicates_skipped": self.duplicates_skipped,
+            })
@@ -0,0 +1,55 @@
+"""
+Per-site time budget shared by every stage of a scrape.
+
+scrape_site creates one Deadline per site (retries included) and
+activates it for the crawl.  The crawlers stop scheduling work once it has
+passed and return what they have, and every static fetch made while it
+is active has its timeout cut to the remaining budget (see http_client),
+so a slow site ends with partial results instead of a killed worker.
+"""
+
+import math
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Shortest timeout handed to a fetch or navigation, however little is left
+MIN_TIMEOUT = 0.5
+
+_current: ContextVar["Deadline | None"] = ContextVar("scrape_deadline", default=None)
+
+
+class Deadline:
+    def __init__(self, seconds: float | None = None) -> None:
+        """A budget of `seconds` from now; None means unbounded."""
+        self.expires_at = None if seconds is None else time.monotonic() + seconds
+        # Set once anything found the budget spent
+        self.reached = False
+
+    def remaining(self) -> float:
+        if self.expires_at is None:
+            return math.inf
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        if self.expires_at is not None and time.monotonic() >= self.expires_at:
+            self.reached = True
+        return self.reached
+
+    def timeout(self, cap: float) -> float:
+        """cap, shortened to what is left of the budget."""
+        return max(MIN_TIMEOUT, min(cap, self.remaining()))
+
+    @contextmanager
+    def active(self):
+        """Make this the deadline static fetches in this context respect."""
+        token = _current.set(self)
+        try:
+            yield self
+        finally:
+            _current.reset(token)
+
+
+def current_deadline() -> Deadline | None:
+    """The deadline activated for this context (threads from asyncio.to_thread inherit it)."""
+    return _current.get()
@@ -1,230 +1,354 @@
-import re
 import os
-import json
+import math
+import asyncio
 import requests
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
-from bs4 import BeautifulSoup, Comment
-from urllib.parse import urljoin, urlparse, urldefrag
+from requests.compat import chardet
+from bs4 import BeautifulSoup
+from typing import Iterable
+from urllib.parse import urljoin, urlparse
+from urllib3.exceptions import DecodeError, ProtocolError, ReadTimeoutError, SSLError
+from urllib3.response import HTTPResponse
+from scraper.crawl_state import CrawlState
+from scraper.deadline import current_deadline
+from scraper.html_extract import extract_emails_and_links
+from scraper.http_client import HOST_CONCURRENCY, get_session
+from scraper.urls import url_key
 from scraper.utils import (
-    EMAIL_PATTERN,
-    BAD_EXTENSIONS,
-    OBFUSCATED_EMAIL_PATTERN,
-    PRIORITY_KEYWORDS,
-    REQUEST_HEADERS,
+    HTML_PARSER,
+    content_fingerprint,
     is_same_domain,
-    is_valid_html_link,
     is_priority_link,
-    is_junk_email,
 )
 
 
-def make_session() -> requests.Session:
-    """Session with retry logic and realistic browser headers."""
-    session = requests.Session()
-    retry = Retry(total=2, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503])
-    adapter = HTTPAdapter(max_retries=retry)
-    session.mount("http://", adapter)
-    session.mount("https://", adapter)
-    session.headers.update(REQUEST_HEADERS)
-    return session
+# Bytes of a page downloaded at most; anything past it is dropped and the
+# partial document parsed as is
+MAX_PAGE_BYTES = int(os.getenv("STATIC_MAX_PAGE_BYTES", str(2 * 1024 * 1024)))
+# Media types worth parsing (a missing Content-Type is given the benefit of
+# the doubt).  Matched exactly: "xml" alone would also let in docx/xlsx
+# (application/vnd.openxmlformats-…), SVG and RSS/Atom feeds.
+PARSEABLE_TYPES = ("text/html", "application/xhtml+xml", "text/xml", "application/xml")
 
 
-def extract_emails_from_text(text: str) -> set[str]:
-    emails = set(re.findall(EMAIL_PATTERN, text))
-    for parts in re.findall(OBFUSCATED_EMAIL_PATTERN, text):
-        emails.add(f"{parts[0]}@{parts[1]}.{parts[2]}")
-    return {e.lower() for e in emails if not is_junk_email(e)}
+def _sitemap_contact_urls(base_url: str, sm_url: str, session: requests.Session) -> set[str]:
+    contact_urls = set()
+    try:
+        with session.get(sm_url, timeout=8, stream=True) as r:
+            if not r.ok or "xml" not in r.headers.get("content-type", ""):
+                return contact_urls
+            text, _ = read_body(r)
+        sm_soup = BeautifulSoup(text, "xml")
+        locs = [tag.get_text() for tag in sm_soup.find_all("loc")]
+        for loc in locs:
+            if is_same_domain(base_url, loc) and is_priority_link(loc):
+                contact_urls.add(loc)
+    except Exception:
+        pass
+    return contact_urls
 
 
-def extract_emails_from_jsonld(soup: BeautifulSoup) -> set[str]:
-    """Pull emails out of JSON-LD structured data (schema.org markup)."""
-    emails = set()
-    for script in soup.find_all("script", type="application/ld+json"):
-        try:
-            raw = script.string or ""
-            data = json.loads(raw)
-            items = data if isinstance(data, list) else [data]
-            for item in items:
-                # Direct email field
-                if isinstance(item.get("email"), str):
-                    emails.add(item["email"].lower())
-                # contactPoint array
-                for cp in item.get("contactPoint", []):
-                    if isinstance(cp.get("email"), str):
-                        emails.add(cp["email"].lower())
-                # sameAs / url fields (sometimes contain mailto:)
-                for val in item.get("sameAs", []):
-                    if isinstance(val, str) and val.startswith("mailto:"):
-                        emails.add(val[7:].lower())
-        except Exception:
-            pass
-    return {e for e in emails if not is_junk_email(e)}
-
-
-def discover_sitemap_contact_urls(base_url: str, session: requests.Session) -> set[str]:
+async def discover_sitemap_contact_urls(base_url: str, session: requests.Session) -> set[str]:
     """
     Fetch /sitemap.xml (and /sitemap_index.xml) and return any URLs whose
     path contains a contact/about keyword.  These are high-value pages.
+    All candidates are fetched concurrently.
     """
-    contact_urls = set()
     candidates = [
         urljoin(base_url, "/sitemap.xml"),
         urljoin(base_url, "/sitemap_index.xml"),
         urljoin(base_url, "/sitemap"),
     ]
-    for sm_url in candidates:
-        try:
-            r = session.get(sm_url, timeout=8)
-            if not r.ok or "xml" not in r.headers.get("content-type", ""):
-                continue
-            sm_soup = BeautifulSoup(r.text, "xml")
-            locs = [tag.get_text() for tag in sm_soup.find_all("loc")]
-            for loc in locs:
-                if is_same_domain(base_url, loc) and is_priority_link(loc):
-                    contact_urls.add(loc)
-        except Exception:
-            pass
-    return contact_urls
+    results = await asyncio.gather(*(
+        asyncio.to_thread(_sitemap_contact_urls, base_url, sm_url, session)
+        for sm_url in candidates
+    ))
+    return set().union(*results)
 
 
-def extract_links(soup: BeautifulSoup, base_url: str) -> set[str]:
+class FetchedPage:
     """
-    Collect all same-domain links from the page, always including links
-    from nav, header, footer, and the full body.  Results are returned
-    as a set; callers should sort by is_priority_link().
+    One downloaded page.  The HTML is parsed at most once (on first access
+    to .soup), so SPA classification, email extraction and link discovery
+    can all share a single fetch and a single parse.
+
+    Pages that aren't HTML/XML are never downloaded: ok is False and html
+    empty.  truncated says the body was cut at MAX_PAGE_BYTES.
     """
-    links = set()
 
-    def _add_from(selector_tags):
-        for section in soup.find_all(selector_tags):
-            for a in section.find_all("a", href=True):
-                href = a["href"]
-                if is_valid_html_link(href):
-                    href, _ = urldefrag(href)
-                    full_url = urljoin(base_url, href)
-                    if is_same_domain(base_url, full_url):
-                        links.add(full_url)
+    def __init__(self, url: str, response: requests.Response, html: str, truncated: bool = False) -> None:
+        self.url = url
+        self.final_url = response.url
+        self.status_code = response.status_code
+        self.headers = response.headers
+        self.parseable = is_parseable(response)
+        self.ok = response.ok and self.parseable
+        self.html = html
+        self.truncated = truncated
+        # Visible-text hash, used to skip pages whose content was already seen
+        self.fingerprint = content_fingerprint(self.html) if self.ok else ""
+        self._soup: BeautifulSoup | None = None
 
-    # Structural sections first (fast, usually correct)
-    _add_from(["nav", "header", "footer", "aside"])
+    @property
+    def soup(self) -> BeautifulSoup:
+        if self._soup is None:
+            self._soup = BeautifulSoup(self.html, HTML_PARSER)
+        return self._soup
 
-    # Always fall back to full body to catch anything the structure missed
-    for a in soup.find_all("a", href=True):
-        href = a["href"]
-        if is_valid_html_link(href):
-            href, _ = urldefrag(href)
-            full_url = urljoin(base_url, href)
-            if is_same_domain(base_url, full_url):
-                links.add(full_url)
 
-    return links
+def media_type(response: requests.Response) -> str:
+    """'text/html; charset=utf-8' → 'text/html'"""
+    return response.headers.get("content-type", "").split(";")[0].strip().lower()
 
 
-def scrape_page(url: str, session: requests.Session, debug=False) -> tuple[set[str], set[str]]:
-    emails: set[str] = set()
-    links: set[str] = set()
+def is_parseable(response: requests.Response) -> bool:
+    media = media_type(response)
+    return not media or media in PARSEABLE_TYPES
 
+
+def _iter_body(response: requests.Response, chunk_size: int):
+    """
+    response.iter_content, except that each read returns whatever has
+    arrived (up to chunk_size) instead of waiting for a full chunk, so a
+    body that trickles in can be cut off between reads.
+    """
+    raw = response.raw
+    if not isinstance(raw, HTTPResponse):
+        yield from response.iter_content(chunk_size)
+        return
+    # Same exception mapping as iter_content
+    try:
+        while chunk := raw.read1(chunk_size, decode_content=True):
+            yield chunk
+    except ProtocolError as e:
+        raise requests.exceptions.ChunkedEncodingError(e)
+    except DecodeError as e:
+        raise requests.exceptions.ContentDecodingError(e)
+    except ReadTimeoutError as e:
+        raise requests.exceptions.ConnectionError(e)
+    except SSLError as e:
+        raise requests.exceptions.SSLError(e)
+
+
+def read_body(response: requests.Response, max_bytes: int = MAX_PAGE_BYTES) -> tuple[str, bool]:
+    """
+    Stream a response's body up to max_bytes and decode it like
+    response.text would.  Returns (text, truncated).  Reading also stops,
+    truncated, once the active deadline (see scraper.deadline) has passed.
+    """
+    body = bytearray()
+    truncated = False
+    deadline = current_deadline()
+    for chunk in _iter_body(response, 64 * 1024):
+        body += chunk
+        if len(body) >= max_bytes:
+            truncated = True
+            del body[max_bytes:]
+            break
+        if deadline is not None and deadline.expired():
+            truncated = True
+            break
+    encoding = response.encoding or chardet.detect(bytes(body[:64 * 1024]))["encoding"] or "utf-8"
     try:
-        response = session.get(url, timeout=20, allow_redirects=True)
-        response.raise_for_status()
-        soup = BeautifulSoup(response.text, "html.parser")
-
-        # Visible text
-        emails |= extract_emails_from_text(soup.get_text())
-
-        # mailto: links
-        for a in soup.find_all("a", href=True):
-            href = a["href"]
-            if href.startswith("mailto:"):
-                addr = href[7:].split("?")[0].strip().lower()
-                if addr and not is_junk_email(addr):
-                    emails.add(addr)
-
-        # HTML attributes
-        for tag in soup.find_all(True):
-            for attr in ("title", "alt", "data-email", "data-mail", "data-contact", "content"):
-                val = tag.attrs.get(attr, "")
-                if val:
-                    emails |= extract_emails_from_text(val)
-
-        # <meta> tag content (og:email, twitter:email, etc.)
-        for meta in soup.find_all("meta"):
-            content = meta.get("content", "")
-            if content:
-                emails |= extract_emails_from_text(content)
-
-        # JSON-LD structured data (schema.org)
-        emails |= extract_emails_from_jsonld(soup)
-
-        # Inline <script> blocks
-        for script in soup.find_all("script"):
-            if script.string:
-                emails |= extract_emails_from_text(script.string)
-
-        # HTML comments
-        for comment in soup.find_all(string=lambda t: isinstance(t, Comment)):
-            emails |= extract_emails_from_text(comment)
-
-        # Links for crawling
-        links = extract_links(soup, url)
+        return body.decode(encoding, "replace"), truncated
+    except LookupError:
+        return body.decode("utf-8", "replace"), truncated
+
 
+def fetch_page(url: str, session: requests.Session, timeout: int = 20, debug=False) -> FetchedPage | None:
+    """
+    GET url, streaming at most MAX_PAGE_BYTES and skipping the body of
+    anything that isn't HTML/XML; returns None when the request itself fails.
+    """
+    try:
+        with session.get(url, timeout=timeout, allow_redirects=True, stream=True) as response:
+            if not is_parseable(response):
+                if debug:
+                    print(f"[INFO] Skipping {url}: {response.headers.get('content-type')}")
+                return FetchedPage(url, response, "")
+            html, truncated = read_body(response)
+            if truncated and debug:
+                print(f"[INFO] {url} truncated at {MAX_PAGE_BYTES} bytes")
+            return FetchedPage(url, response, html, truncated)
     except requests.RequestException as e:
         if debug:
             print(f"[ERROR] Failed to access {url}: {e}")
+        return None
+
 
+def scrape_page(url: str, session: requests.Session, debug=False) -> tuple[set[str], set[str]]:
+    return extract_page(fetch_page(url, session, debug=debug), debug=debug)
+
+
+def extract_page(
+    page: FetchedPage | None, debug=False, site: Iterable[str] | None = None
+) -> tuple[set[str], set[str]]:
+    """
+    Emails and on-site links from an already fetched page.  The site is
+    the hosts of the `site` URLs, by default the page's own.
+    """
+    emails: set[str] = set()
+    links: set[str] = set()
+
+    if page is None:
+        return emails, links
+    if not page.ok:
+        if debug and page.parseable:
+            print(f"[ERROR] Failed to access {page.url}: HTTP {page.status_code}")
+        return emails, links
+
+    # Relative links resolve against where any redirects ended up
+    emails, links = extract_emails_and_links(page.soup, page.final_url, site)
     return emails, links
 
 
-def extract_emails_recursive(
+async def extract_emails_recursive(
     start_url: str,
     max_depth: int = 2,
-    tmp_file: str = "tmp_file.txt",
     debug: bool = False,
+    host_concurrency: int = HOST_CONCURRENCY,
+    session: requests.Session | None = None,
+    homepage: FetchedPage | None = None,
+    state: CrawlState | None = None,
 ) -> list[str]:
-    session = make_session()
-    visited: set[str] = set()
+    """
+    Crawl a site breadth-first, fetching each depth's frontier concurrently
+    (at most host_concurrency pages in flight per host) over the
+    process-wide pooled session (see http_client), which also throttles
+    hosts shared with other crawls.  Wall time per depth is roughly its
+    slowest page.
+
+    Pass the already fetched start page as `homepage` to skip downloading
+    and parsing it again.  Pages whose content matches one already crawled
+    are skipped, links included.  Each visited page is reported to `state`, whose
+    strategy decides whether the crawl stops at the first tier that yields
+    an on-domain email (see crawl_state).
+
+    URLs are de-duplicated by scraper.urls.url_key, and every redirect
+    target counts as visited, so scheme, www and trailing-slash variants
+    of a page are fetched once.  Links are followed only to the start
+    URL's host and the one the homepage redirects to, whichever page they
+    are found on, so a page that redirects off-site doesn't widen the
+    crawl.
+
+    Once state.deadline passes no more pages are fetched, pages still in
+    flight are abandoned, and the emails found so far are returned.
+    """
+    session = session or get_session()
+    visited: set[str] = set()  # url_key()s
     all_emails: set[str] = set()
+    state = state or CrawlState(site_url=start_url)
+    host_slots: dict[str, asyncio.Semaphore] = {}
+    deadline = state.deadline
+    # The crawl's scope: the start URL, plus wherever the homepage redirects,
+    # settled once the homepage is fetched
+    site_urls = [start_url]
+    site_known = asyncio.Event()
+
+    async def _extract(page: FetchedPage | None) -> tuple[set[str], set[str]] | None:
+        """extract_page, or None when the page duplicates one already crawled."""
+        if page is not None:
+            visited.add(url_key(page.final_url))
+        if page is not None and page.ok and state.is_duplicate(page.fingerprint):
+            if debug:
+                print(f"[INFO] Duplicate content, skipping: {page.url}")
+            return None
+        await site_known.wait()
+        return await asyncio.to_thread(extract_page, page, debug, site_urls)
+
+    async def _fetch(url: str) -> FetchedPage | None:
+        host = urlparse(url).netloc
+        slots = host_slots.setdefault(host, asyncio.Semaphore(max(1, host_concurrency)))
+        async with slots:
+            if deadline.expired():
+                return None
+            if debug:
+                print(f"[INFO] Crawling: {url}")
+            return await asyncio.to_thread(fetch_page, url, session, debug=debug)
 
-    # Seed with homepage + any contact pages found via sitemap
-    sitemap_contacts = discover_sitemap_contact_urls(start_url, session)
-    to_visit: set[str] = {start_url} | sitemap_contacts
+    async def _scrape(url: str) -> tuple[set[str], set[str]] | None:
+        return await _extract(await _fetch(url))
+
+    async def _home() -> tuple[set[str], set[str]] | None:
+        try:
+            page = homepage if homepage is not None else await _fetch(start_url)
+            if page is not None and page.ok:
+                site_urls.append(page.final_url)
+        finally:
+            site_known.set()
+        return await _extract(page)
+
+    # Homepage and sitemap discovery go out together
+    home_task = asyncio.ensure_future(_home())
+    visited.add(url_key(start_url))
+    sitemap_contacts = await discover_sitemap_contact_urls(start_url, session)
 
     if debug and sitemap_contacts:
         print(f"[INFO] Sitemap gave {len(sitemap_contacts)} contact pages")
 
-    for depth in range(max_depth):
-        if debug:
-            print(f"\n[INFO] Depth {depth + 1}/{max_depth} — {len(to_visit)} URLs")
-
-        next_to_visit: set[str] = set()
-
-        # Sort so priority pages (contact, about, …) are visited first
-        ordered = sorted(to_visit, key=lambda l: 0 if is_priority_link(l) else 1)
+    pending: list[asyncio.Future] = []
 
-        for url in ordered:
-            if url in visited:
+    def _schedule(urls) -> list[asyncio.Future]:
+        # Sorted so priority pages (contact, about, …) get the first slots
+        tasks = []
+        for url in sorted(urls, key=lambda l: 0 if is_priority_link(l) else 1):
+            key = url_key(url)
+            if key in visited:
                 continue
-            visited.add(url)
-
-            if debug:
-                print(f"[INFO] Crawling: {url}")
-
-            emails, links = scrape_page(url, session, debug=debug)
-            all_emails |= emails
-
-            # Write partial results so the parent process can read them on timeout
-            with open(tmp_file, "w", encoding="utf-8") as f:
-                for e in all_emails:
-                    f.write(f"{e}\n")
-                f.flush()
-                os.fsync(f.fileno())
-
-            priority_links = sorted(links, key=lambda l: 0 if is_priority_link(l) else 1)
-            next_to_visit |= {l for l in priority_links if l not in visited}
+            visited.add(key)
+            tasks.append(asyncio.ensure_future(_scrape(url)))
+        pending.extend(tasks)
+        return tasks
+
+    async def _run_wave(tier: int, depth: int, tasks: list[asyncio.Future]) -> set[str]:
+        """Collect one wave of pages; returns the unvisited links they point to."""
+        state.tier = tier
+        if debug:
+            print(f"\n[INFO] Depth {depth + 1}/{max_depth}, tier {tier} — {len(tasks)} URLs")
+        next_links: set[str] = set()
+        remaining = deadline.remaining()
+        for future in asyncio.as_completed(tasks, timeout=None if remaining == math.inf else remaining):
+            try:
+                result = await future
+            except asyncio.TimeoutError:
+                deadline.reached = True
+                if debug:
+                    print("[WARN] Deadline reached, returning partial results")
+                break
+            if result is None:
+                continue  # duplicate: nothing new, and its links stay out
+            emails, links = result
+            all_emails.update(emails)
+            state.add_page(emails, depth)
+            next_links |= {l for l in links if url_key(l) not in visited}
+        return next_links
 
-        to_visit = next_to_visit
-        if not to_visit:
-            break
+    try:
+        # Tier 1: homepage + sitemap contact pages
+        tier1 = [home_task] + _schedule(sitemap_contacts)
+        pending.append(home_task)
+        next_links = await _run_wave(1, 0, tier1)
+
+        for depth in range(1, max_depth):
+            if state.should_stop() or not next_links or deadline.expired():
+                break
+
+            if state.tiered and depth == 1:
+                # Tier 2: priority links off tier 1, tier 3: the rest
+                waves = [
+                    (2, {l for l in next_links if is_priority_link(l)}),
+                    (3, {l for l in next_links if not is_priority_link(l)}),
+                ]
+            else:
+                waves = [(2 if depth == 1 and not state.tiered else 3, next_links)]
+
+            next_links = set()
+            for tier, urls in waves:
+                if state.should_stop() or deadline.expired():
+                    break
+                if urls:
+                    next_links |= await _run_wave(tier, depth, _schedule(urls))
+    finally:
+        for task in pending:
+            task.cancel()
 
     return sorted(all_emails)
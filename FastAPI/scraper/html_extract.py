@@ -0,0 +1,159 @@
+"""
+Single-pass email and link extraction for static pages.
+
+scrape_page used to walk the parsed tree once per source of emails (text,
+mailto links, attributes, meta, JSON-LD, scripts, comments) and twice more
+for links.  extract_emails_and_links collects all of them in one traversal
+and runs the regexes once over the gathered strings.
+"""
+
+import json
+import re
+from html import unescape
+from typing import Iterable
+from bs4 import BeautifulSoup, Comment, NavigableString, Tag
+from urllib.parse import unquote
+from scraper.urls import canonicalize, site_host
+from scraper.utils import (
+    EMAIL_PATTERN,
+    OBFUSCATED_DOT,
+    OBFUSCATED_EMAIL_PATTERN,
+    is_valid_html_link,
+    is_junk_email,
+)
+
+_EMAIL_RE = re.compile(EMAIL_PATTERN)
+_OBFUSCATED_RE = re.compile(OBFUSCATED_EMAIL_PATTERN)
+_OBFUSCATED_DOT_RE = re.compile(OBFUSCATED_DOT, re.I)
+
+# Cloudflare "email protection" link target; the fragment is the encoded address
+CF_EMAIL_PROTECTION = "/cdn-cgi/l/email-protection"
+
+# Attributes that sometimes carry a plain-text email address
+EMAIL_ATTRIBUTES = ("title", "alt", "data-email", "data-mail", "data-contact", "content")
+
+# Joins separately scanned strings; matches neither pattern's character
+# classes nor \s, so no email can be stitched together across two strings.
+_SEP = "\x00"
+
+
+def emails_in_text(text: str) -> set[str]:
+    emails = set(_EMAIL_RE.findall(text))
+    for local, at, domain in _OBFUSCATED_RE.findall(text):
+        at = at.strip().lower()
+        dots = {sep.strip().lower() for sep in _OBFUSCATED_DOT_RE.findall(domain)}
+        # Plain addresses are EMAIL_PATTERN's job
+        if at == "@" and dots == {"."}:
+            continue
+        # Bare words on both sides are prose ("look at this dot com"): the
+        # word " at " needs a bracketed dot, like "[dot]", to count
+        if at == "at" and dots <= {".", "dot"}:
+            continue
+        emails.add(f"{local}@{_OBFUSCATED_DOT_RE.sub('.', domain)}")
+    return {e.lower() for e in emails if not is_junk_email(e)}
+
+
+def decode_cfemail(encoded: str) -> str:
+    """
+    Decode a Cloudflare data-cfemail / email-protection hex string: the
+    first byte is an XOR key for the rest.  Returns "" if malformed.
+    """
+    try:
+        data = bytes.fromhex(encoded.strip())
+        key = data[0]
+        return bytes(b ^ key for b in data[1:]).decode("utf-8")
+    except (ValueError, IndexError, UnicodeDecodeError):
+        return ""
+
+
+def mailto_address(href: str) -> str:
+    """Address of a mailto: href, undoing percent- and entity-encoding."""
+    addr = unescape(unquote(href[7:])).split("?")[0]
+    return addr.strip().lower()
+
+
+def emails_in_jsonld(raw: str) -> set[str]:
+    """Emails from one JSON-LD (schema.org) blob."""
+    emails = set()
+    try:
+        data = json.loads(raw)
+        items = data if isinstance(data, list) else [data]
+        for item in items:
+            # Direct email field
+            if isinstance(item.get("email"), str):
+                emails.add(item["email"].lower())
+            # contactPoint array
+            for cp in item.get("contactPoint", []):
+                if isinstance(cp.get("email"), str):
+                    emails.add(cp["email"].lower())
+            # sameAs / url fields (sometimes contain mailto:)
+            for val in item.get("sameAs", []):
+                if isinstance(val, str) and val.startswith("mailto:"):
+                    emails.add(val[7:].lower())
+    except Exception:
+        pass
+    return {e for e in emails if not is_junk_email(e)}
+
+
+def extract_emails_and_links(
+    soup: BeautifulSoup, base_url: str, site: Iterable[str] | None = None
+) -> tuple[set[str], set[str]]:
+    """
+    Everything scrape_page needs from a parsed page, in one traversal:
+    emails from visible text, mailto: links, email-bearing attributes,
+    <meta> content, JSON-LD, inline scripts and comments, Cloudflare
+    email protection (data-cfemail and /cdn-cgi/l/email-protection links),
+    plus all links for crawling that stay on the site.  Links resolve
+    against base_url; the site is the hosts of the `site` URLs (by default
+    base_url's own).
+    """
+    emails: set[str] = set()
+    links: set[str] = set()
+    site_hosts = {site_host(url) for url in (site or (base_url,))}
+
+    text_parts: list[str] = []   # visible text, concatenated like get_text()
+    extra_parts: list[str] = []  # attributes, scripts, comments — scanned separately
+
+    for node in soup.descendants:
+        if isinstance(node, Tag):
+            attrs = node.attrs
+            for attr in EMAIL_ATTRIBUTES:
+                val = attrs.get(attr)
+                if val:
+                    extra_parts.append(val)
+
+            cfemail = attrs.get("data-cfemail")
+            if cfemail:
+                extra_parts.append(decode_cfemail(cfemail))
+
+            if node.name == "a":
+                href = attrs.get("href")
+                if href is None:
+                    continue
+                if href[:7].lower() == "mailto:":
+                    addr = mailto_address(href)
+                    if addr and not is_junk_email(addr):
+                        emails.add(addr)
+                elif CF_EMAIL_PROTECTION in href:
+                    extra_parts.append(decode_cfemail(href.partition("#")[2]))
+                elif is_valid_html_link(href):
+                    full_url = canonicalize(href, base_url)
+                    if full_url and site_host(full_url) in site_hosts:
+                        links.add(full_url)
+
+            elif node.name == "script":
+                raw = node.string
+                if raw:
+                    extra_parts.append(raw)
+                    if attrs.get("type") == "application/ld+json":
+                        emails |= emails_in_jsonld(raw)
+
+        elif type(node) is NavigableString:
+            text_parts.append(node)
+
+        elif isinstance(node, Comment):
+            extra_parts.append(node)
+
+    emails |= emails_in_text("".join(text_parts))
+    emails |= emails_in_text(_SEP.join(extra_parts))
+    return emails, links
@@ -0,0 +1,232 @@
+"""
+Process-wide HTTP client for every static fetch in the scraper package.
+
+One pooled requests.Session is shared by all crawls in the process, so
+keep-alive connections (and their TLS sessions) are reused across sites
+and jobs instead of being rebuilt per site.  Every request goes through
+HostScheduler, which limits how many requests run against one host at a
+time and adapts that limit:
+  - 429 / 503 halve the host's limit and pause it (Retry-After if given,
+    else an exponential back-off), then the request is retried once
+  - responses slower than SLOW_RESPONSE_SECS shrink the limit by one
+  - a run of fast successes grows it back, up to HOST_CONCURRENCY
+Hosts are keyed by site (www and apex together, see scraper.urls).  A
+streamed request (stream=True) holds its slot until the response is
+closed, so the limit covers body downloads too.  Hosts idle for
+HOST_STATE_TTL seconds are forgotten.
+
+While a scrape's Deadline is active, waiting for a slot and each
+request's timeout are both bounded by what is left of it.
+"""
+
+import os
+import threading
+import time
+import weakref
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from scraper.deadline import current_deadline
+from scraper.urls import site_host
+from scraper.utils import REQUEST_HEADERS
+
+# Requests in flight per host, at most
+HOST_CONCURRENCY = int(os.getenv("STATIC_HOST_CONCURRENCY", "6"))
+# Distinct hosts whose connection pools are kept alive
+POOL_HOSTS = int(os.getenv("HTTP_POOL_HOSTS", "200"))
+SLOW_RESPONSE_SECS = float(os.getenv("HTTP_SLOW_RESPONSE_SECS", "5"))
+MAX_HOST_BACKOFF = float(os.getenv("HTTP_MAX_HOST_BACKOFF", "30"))
+# Seconds an idle host's limit and back-off are remembered
+HOST_STATE_TTL = float(os.getenv("HTTP_HOST_STATE_TTL", "600"))
+# Consecutive fast successes before a throttled host gets a slot back
+_RECOVER_AFTER = 5
+# How often (seconds) idle hosts are swept
+_PRUNE_EVERY = 60
+_THROTTLE_STATUSES = (429, 503)
+
+
+class _HostState:
+    def __init__(self, limit: int) -> None:
+        self.limit = limit
+        self.active = 0
+        self.paused_until = 0.0
+        self.backoff = 0.0
+        self.fast_streak = 0
+        self.last_used = time.monotonic()
+
+
+class HostScheduler:
+    def __init__(self, max_per_host: int = HOST_CONCURRENCY, ttl: float = HOST_STATE_TTL) -> None:
+        self.max_per_host = max(1, max_per_host)
+        self.ttl = ttl
+        self._hosts: dict[str, _HostState] = {}
+        self._cond = threading.Condition()
+        self._pruned_at = time.monotonic()
+
+    def _host(self, host: str) -> _HostState:
+        state = self._hosts.get(host)
+        if state is None:
+            state = self._hosts[host] = _HostState(self.max_per_host)
+        state.last_used = time.monotonic()
+        return state
+
+    def _prune(self, now: float) -> None:
+        """Forget hosts with nothing in flight that haven't been used for ttl."""
+        if now - self._pruned_at < _PRUNE_EVERY:
+            return
+        self._pruned_at = now
+        for host, state in list(self._hosts.items()):
+            if state.active == 0 and now - state.last_used > self.ttl and now >= state.paused_until:
+                del self._hosts[host]
+
+    def acquire(self, host: str, timeout: float | None = None) -> bool:
+        """
+        Block until host has a free slot and isn't backing off; False if
+        that takes longer than timeout.
+        """
+        give_up = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            self._prune(time.monotonic())
+            while True:
+                state = self._host(host)
+                now = time.monotonic()
+                wait = state.paused_until - now
+                if wait <= 0 and state.active < state.limit:
+                    state.active += 1
+                    return True
+                if give_up is not None:
+                    if now >= give_up:
+                        return False
+                    wait = min(wait, give_up - now) if wait > 0 else give_up - now
+                self._cond.wait(timeout=wait if wait > 0 else None)
+
+    def release(self, host: str, status: int | None, elapsed: float, retry_after: float | None = None) -> None:
+        """Free host's slot and adapt its limit to how the request went."""
+        with self._cond:
+            state = self._host(host)
+            state.active -= 1
+            if status in _THROTTLE_STATUSES:
+                state.limit = max(1, state.limit // 2)
+                state.backoff = min(max(1.0, state.backoff * 2), MAX_HOST_BACKOFF)
+                pause = retry_after if retry_after is not None else state.backoff
+                state.paused_until = time.monotonic() + min(pause, MAX_HOST_BACKOFF)
+                state.fast_streak = 0
+            elif status is None or elapsed > SLOW_RESPONSE_SECS:
+                state.limit = max(1, state.limit - 1)
+                state.fast_streak = 0
+            else:
+                state.backoff = 0.0
+                state.fast_streak += 1
+                if state.fast_streak >= _RECOVER_AFTER and state.limit < self.max_per_host:
+                    state.limit += 1
+                    state.fast_streak = 0
+            self._cond.notify_all()
+
+    def snapshot(self) -> dict:
+        """Current per-host limits, for hosts that are throttled."""
+        with self._cond:
+            return {
+                host: {"limit": s.limit, "active": s.active, "backoff": s.backoff}
+                for host, s in self._hosts.items()
+                if s.limit < self.max_per_host or s.backoff
+            }
+
+
+def _retry_after(response: requests.Response) -> float | None:
+    value = response.headers.get("retry-after", "")
+    return float(value) if value.isdigit() else None
+
+
+def _fit_timeout(timeout, deadline):
+    """A requests timeout (number or (connect, read) pair) cut to the deadline."""
+    if isinstance(timeout, tuple):
+        return tuple(deadline.timeout(t if t is not None else deadline.remaining()) for t in timeout)
+    return deadline.timeout(timeout if timeout is not None else deadline.remaining())
+
+
+class PoliteSession(requests.Session):
+    """requests.Session whose every request is scheduled by a HostScheduler."""
+
+    def __init__(self, scheduler: HostScheduler) -> None:
+        super().__init__()
+        self.scheduler = scheduler
+
+    def request(self, method, url, *args, **kwargs):
+        host = site_host(url)
+        deadline = current_deadline()
+        for attempt in range(2):
+            if deadline is not None:
+                if deadline.expired() or not self.scheduler.acquire(host, timeout=deadline.remaining()):
+                    deadline.reached = True
+                    raise requests.Timeout(f"Scrape deadline reached before requesting {url}")
+                kwargs["timeout"] = _fit_timeout(kwargs.get("timeout"), deadline)
+            else:
+                self.scheduler.acquire(host)
+            started = time.monotonic()
+            status = retry_after = None
+            hold = False
+            try:
+                response = super().request(method, url, *args, **kwargs)
+                status = response.status_code
+                if status in _THROTTLE_STATUSES:
+                    retry_after = _retry_after(response)
+                # The body of a streamed response is still to come
+                hold = kwargs.get("stream") and (status not in _THROTTLE_STATUSES or attempt == 1)
+            finally:
+                if not hold:
+                    self.scheduler.release(host, status, time.monotonic() - started, retry_after)
+            if hold:
+                self._release_on_close(response, host, started, retry_after)
+                return response
+            if status not in _THROTTLE_STATUSES or attempt == 1:
+                return response
+            response.close()  # retry once the host's pause is over
+
+    def _release_on_close(self, response: requests.Response, host: str, started: float, retry_after) -> None:
+        """Release host's slot when response is closed (or, failing that, collected)."""
+        scheduler, status = self.scheduler, response.status_code
+        once = threading.Lock()
+
+        def release():
+            if once.acquire(blocking=False):
+                scheduler.release(host, status, time.monotonic() - started, retry_after)
+
+        close = response.close
+
+        def close_and_release():
+            try:
+                close()
+            finally:
+                release()
+
+        response.close = close_and_release
+        # A caller that never closes the response mustn't leak the slot
+        weakref.finalize(response, release)
+
+
+class DeadlineRetry(Retry):
+    """urllib3 Retry that stops retrying once the active Deadline has passed."""
+
+    def is_exhausted(self) -> bool:
+        deadline = current_deadline()
+        return super().is_exhausted() or (deadline is not None and deadline.expired())
+
+
+_session: PoliteSession | None = None
+_session_lock = threading.Lock()
+
+
+def get_session() -> PoliteSession:
+    """The process-wide session, created on first use."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = PoliteSession(HostScheduler())
+            # 429/503 are HostScheduler's business; only retry server errors here
+            retry = DeadlineRetry(total=2, backoff_factor=0.5, status_forcelist=[500, 502])
+            adapter = HTTPAdapter(max_retries=retry, pool_connections=POOL_HOSTS, pool_maxsize=HOST_CONCURRENCY)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            session.headers.update(REQUEST_HEADERS)
+            _session = session
+        return _session
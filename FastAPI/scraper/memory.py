@@ -0,0 +1,119 @@
+"""
+Process and container memory, read straight from /proc and the cgroup
+filesystem so no extra dependency is needed.
+
+On platforms without /proc every figure reads 0 (available: None), so
+nothing is ever recycled or refused for memory there.
+"""
+
+import os
+
+MB = 1024 * 1024
+
+try:
+    _PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+except (AttributeError, ValueError, OSError):
+    _PAGE_SIZE = 4096
+
+
+def rss(pid: int | str = "self") -> int:
+    """Resident set size of one process in bytes; 0 when it is gone."""
+    try:
+        with open(f"/proc/{pid}/statm") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+def descendants(pid: int) -> list[int]:
+    """Every live process below pid (children, grandchildren, …)."""
+    children: dict[int, list[int]] = {}
+    try:
+        entries = os.listdir("/proc")
+    except OSError:
+        return []
+    for entry in entries:
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                stat = f.read()
+            # The command name may hold spaces and parentheses; the parent
+            # pid is the second field after its closing ")"
+            ppid = int(stat.rsplit(")", 1)[1].split()[1])
+        except (OSError, ValueError, IndexError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+
+    found: list[int] = []
+    stack = list(children.get(pid, []))
+    while stack:
+        child = stack.pop()
+        found.append(child)
+        stack.extend(children.get(child, []))
+    return found
+
+
+def tree_rss(pid: int, include_self: bool = True) -> int:
+    """
+    RSS of pid and all its descendants in bytes.  Pages shared between the
+    processes (Chromium's are) are counted once per process, so this errs
+    on the high side.
+    """
+    total = rss(pid) if include_self else 0
+    return total + sum(rss(child) for child in descendants(pid))
+
+
+def _read_int(path: str) -> int | None:
+    try:
+        with open(path) as f:
+            value = f.read().strip()
+    except OSError:
+        return None
+    return int(value) if value.isdigit() else None  # "max" → no limit
+
+
+def _stat(path: str, key: str) -> int:
+    """One counter from a cgroup memory.stat file; 0 if missing."""
+    try:
+        with open(path) as f:
+            for line in f:
+                name, _, value = line.partition(" ")
+                if name == key:
+                    return int(value)
+    except (OSError, ValueError):
+        pass
+    return 0
+
+
+def available() -> int | None:
+    """
+    Bytes that can still be allocated: the tighter of the cgroup (v2 or
+    v1) limit and the host's MemAvailable.  None when neither is known.
+
+    Cgroup usage counts the page cache, which the kernel reclaims under
+    pressure, so inactive file pages are subtracted from it first, the way
+    kubelet and cAdvisor compute a container's working set.
+    """
+    candidates = []
+    for limit_path, usage_path, stat_path, inactive_key in (
+        ("/sys/fs/cgroup/memory.max", "/sys/fs/cgroup/memory.current",
+         "/sys/fs/cgroup/memory.stat", "inactive_file"),
+        ("/sys/fs/cgroup/memory/memory.limit_in_bytes", "/sys/fs/cgroup/memory/memory.usage_in_bytes",
+         "/sys/fs/cgroup/memory/memory.stat", "total_inactive_file"),
+    ):
+        limit, usage = _read_int(limit_path), _read_int(usage_path)
+        # cgroup v1 reports "no limit" as a huge number
+        if limit is not None and usage is not None and limit < 1 << 60:
+            working_set = max(0, usage - _stat(stat_path, inactive_key))
+            candidates.append(max(0, limit - working_set))
+            break
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    candidates.append(int(line.split()[1]) * 1024)
+                    break
+    except (OSError, ValueError, IndexError):
+        pass
+    return min(candidates) if candidates else None
@@ -0,0 +1,111 @@
+"""
+Cheap HTTP probe for guessed contact routes.
+
+The SPA crawler used to open every COMMON_EMAIL_ROUTES path in Chromium,
+although most of them are 404s or "soft 404s" that serve the homepage (or
+the app shell) with a 200.  probe_routes fetches all candidates in parallel
+over plain HTTP and keeps only those that answer 200 with content distinct
+from both the homepage and a known-missing page.
+
+Client-routed apps with a history fallback serve the same shell for every
+path, the missing page included, so HTTP can't tell their routes apart.
+Such a shell has next to no visible text, unlike a server-rendered soft
+404; for those sites the first SHELL_ROUTE_CAP candidates (in the order
+given, most promising first) are kept for Chromium to try.
+"""
+
+import asyncio
+import os
+import uuid
+import requests
+from typing import Iterable
+from urllib.parse import urljoin, urlparse
+from scraper.email_extractor import MAX_PAGE_BYTES, is_parseable, read_body
+from scraper.http_client import HOST_CONCURRENCY, get_session
+from scraper.urls import url_key
+from scraper.utils import content_fingerprint, visible_text
+
+PROBE_TIMEOUT = float(os.getenv("ROUTE_PROBE_TIMEOUT", "5"))
+# At most this much of each body is read, as for a crawled page: a shorter
+# prefix can stop at a large shared <head> and make every page look alike
+PROBE_MAX_BYTES = int(os.getenv("ROUTE_PROBE_MAX_BYTES", str(MAX_PAGE_BYTES)))
+# Guessed routes kept when the site answers every path with the same shell
+SHELL_ROUTE_CAP = int(os.getenv("ROUTE_PROBE_SHELL_CAP", "8"))
+# A missing page with less visible text than this is an app shell
+SHELL_MAX_TEXT = int(os.getenv("ROUTE_PROBE_SHELL_MAX_TEXT", "200"))
+
+
+def _probe(url: str, session: requests.Session) -> tuple[int, str, str, int] | None:
+    """
+    (status, final url, fingerprint, visible text length) for url, or None
+    if the request fails.  The fingerprint is "" (and the length 0) unless
+    the answer is a 200 HTML/XML page.
+    """
+    try:
+        # GET rather than HEAD: many servers mishandle HEAD, and telling a
+        # soft 404 from a real page needs the body anyway.
+        with session.get(url, timeout=PROBE_TIMEOUT, allow_redirects=True, stream=True) as r:
+            if r.status_code != 200 or not is_parseable(r):
+                return r.status_code, r.url, "", 0
+            text, _ = read_body(r, PROBE_MAX_BYTES)
+            # A bare "/" would strip every slash from the homepage's text
+            path = urlparse(url).path
+            ignore = path if path.strip("/") else ""
+            return r.status_code, r.url, content_fingerprint(text, ignore=ignore), len(visible_text(text))
+    except requests.RequestException:
+        return None
+
+
+async def probe_routes(
+    start_url: str,
+    urls: Iterable[str],
+    session: requests.Session | None = None,
+    debug=False,
+) -> set[str]:
+    """
+    The subset of urls that resolve to a real page of their own.  urls
+    should come most promising first; the order decides which are kept
+    when the site serves one shell for every path.
+    """
+    candidates = list(dict.fromkeys(urls))
+    if not candidates:
+        return set()
+    session = session or get_session()
+    slots = asyncio.Semaphore(max(1, HOST_CONCURRENCY))
+
+    async def _one(url: str):
+        async with slots:
+            return await asyncio.to_thread(_probe, url, session)
+
+    # Reference pages: what the homepage and a path that can't exist look like
+    missing_url = urljoin(start_url, f"/{uuid.uuid4().hex}")
+    home, missing, *results = await asyncio.gather(
+        _one(start_url), _one(missing_url), *(_one(url) for url in candidates)
+    )
+
+    soft_404s = {ref[2] for ref in (home, missing) if ref and ref[0] == 200}
+    home_key = url_key(home[1] if home else start_url)
+    # A missing page answered with a near-empty page: every path gets the app shell
+    shell = missing is not None and missing[0] == 200 and missing[3] < SHELL_MAX_TEXT
+
+    kept = set()
+    shell_routes = 0
+    for url, result in zip(candidates, results):
+        if result is None:
+            continue
+        status, final_url, fingerprint, _ = result
+        if status != 200 or not fingerprint:
+            continue
+        # Redirected back to the homepage
+        if url_key(final_url) == home_key:
+            continue
+        if fingerprint in soft_404s:
+            if not shell or shell_routes >= SHELL_ROUTE_CAP:
+                continue
+            shell_routes += 1
+        kept.add(url)
+
+    if debug:
+        note = " (app shell on every path)" if shell else ""
+        print(f"[DEBUG] Route probe kept {len(kept)}/{len(candidates)} guessed routes{note}.")
+    return kept
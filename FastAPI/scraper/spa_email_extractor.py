@@ -3,20 +3,39 @@ SPA Email Extractor — Playwright-based.
 Handles JavaScript-rendered sites, phone trees, and dynamic content.
 """
 
-import re
-import json
 import asyncio
 import os
+import time
 from urllib.parse import urljoin, urlparse
-from playwright.async_api import async_playwright, Page
+from playwright.async_api import Page
+from scraper.browser_pool import MAX_PAGES_PER_CONTEXT, get_browser_pool
+from scraper.crawl_state import CrawlState
+from scraper.deadline import Deadline
+from scraper.html_extract import emails_in_jsonld, emails_in_text, mailto_address
+from scraper.route_probe import probe_routes
+from scraper.urls import same_site, url_key
 from scraper.utils import (
     EMAIL_PATTERN,
-    OBFUSCATED_EMAIL_PATTERN,
     REQUEST_HEADERS,
+    content_fingerprint,
     is_priority_link,
     is_junk_email,
 )
 
+# How visit_url decides a rendered page is ready to extract:
+#   adaptive    – wait until DOM mutations settle for SPA_QUIET_MS, or an
+#                 email shows up, capped at SPA_PAGE_BUDGET_MS
+#   networkidle – wait for network idle, capped at SPA_PAGE_BUDGET_MS
+ADAPTIVE = "adaptive"
+NETWORKIDLE = "networkidle"
+DEFAULT_WAIT_STRATEGY = os.getenv("SPA_WAIT_STRATEGY", ADAPTIVE)
+QUIET_MS = int(os.getenv("SPA_QUIET_MS", "500"))
+PAGE_BUDGET_MS = int(os.getenv("SPA_PAGE_BUDGET_MS", "4000"))
+
+# XHR/fetch responses larger than this aren't scanned for emails
+RESPONSE_SCAN_MAX_BYTES = int(os.getenv("SPA_RESPONSE_SCAN_MAX_BYTES", str(512 * 1024)))
+_SCANNED_CONTENT_TYPES = ("json", "text/plain", "text/html", "text/xml", "application/xml")
+
 # Expanded route list — covers many real-world contact page paths
 COMMON_EMAIL_ROUTES = [
     # Contact variants
@@ -55,148 +74,314 @@ _BLOCKED_DOMAINS = [
 ]
 
 
-async def extract_emails_from_page(page: Page, debug=False) -> set[str]:
-    emails: set[str] = set()
+# Everything the extractor needs from a rendered page, collected in-page by
+# one evaluate() call instead of a Playwright round trip per selector/element
+_SNAPSHOT_JS = """
+() => {
+    const hrefs = (selector, limit) => {
+        const out = [];
+        for (const a of document.querySelectorAll(selector)) {
+            if (limit && out.length >= limit) break;
+            const href = a.getAttribute("href");
+            if (href) out.push(href);
+        }
+        return out;
+    };
+    const dataAttrs = ["data-email", "data-mail", "data-contact"];
+    return {
+        url: location.href,
+        html: document.documentElement ? document.documentElement.outerHTML : "",
+        text: document.body ? document.body.innerText : "",
+        mailtos: hrefs("a[href^='mailto:']"),
+        jsonld: Array.from(
+            document.querySelectorAll("script[type='application/ld+json']"),
+            s => s.textContent || ""
+        ),
+        data: Array.from(
+            document.querySelectorAll(dataAttrs.map(a => `[${a}]`).join(",")),
+            el => dataAttrs.map(a => el.getAttribute(a) || "")
+        ).flat().filter(Boolean),
+        // nav/header/footer/aside first (footer often has contact/about),
+        // then a capped catch-all
+        links: [].concat(
+            hrefs("nav a[href]"), hrefs("header a[href]"),
+            hrefs("footer a[href]"), hrefs("aside a[href]"),
+            hrefs("a[href]", 150)
+        ),
+    };
+}
+"""
 
-    try:
-        content = await page.content()
-    except Exception:
-        content = ""
 
+async def snapshot_page(page: Page) -> dict | None:
+    """One-IPC snapshot of the rendered page (see _SNAPSHOT_JS), or None."""
     try:
-        text = await page.inner_text("body")
+        return await page.evaluate(_SNAPSHOT_JS)
     except Exception:
-        text = ""
+        return None
 
-    emails.update(re.findall(EMAIL_PATTERN, content))
-    emails.update(re.findall(EMAIL_PATTERN, text))
 
-    # Obfuscated pattern (e.g. "user [at] domain [dot] com")
-    for parts in re.findall(OBFUSCATED_EMAIL_PATTERN, text):
-        emails.add(f"{parts[0]}@{parts[1]}.{parts[2]}")
+def emails_from_snapshot(snapshot: dict | None, debug=False) -> set[str]:
+    if not snapshot:
+        return set()
 
-    # mailto: links
-    try:
-        for element in await page.query_selector_all("a[href^='mailto:']"):
-            href = await element.get_attribute("href")
-            if href:
-                addr = href.replace("mailto:", "").split("?")[0].strip().lower()
-                if addr:
-                    emails.add(addr)
-    except Exception:
-        pass
+    # Page source and visible text; obfuscated "user [at] domain [dot] com" too
+    emails = emails_in_text(snapshot["html"]) | emails_in_text(snapshot["text"])
 
-    # JSON-LD structured data
-    try:
-        ld_scripts = await page.query_selector_all("script[type='application/ld+json']")
-        for script_el in ld_scripts:
-            raw = await script_el.inner_text()
-            try:
-                data = json.loads(raw)
-                items = data if isinstance(data, list) else [data]
-                for item in items:
-                    if isinstance(item.get("email"), str):
-                        emails.add(item["email"].lower())
-                    for cp in item.get("contactPoint", []):
-                        if isinstance(cp.get("email"), str):
-                            emails.add(cp["email"].lower())
-            except Exception:
-                pass
-    except Exception:
-        pass
+    # mailto: links, decoded as on the static path
+    for href in snapshot["mailtos"]:
+        addr = mailto_address(href)
+        if addr and not is_junk_email(addr):
+            emails.add(addr)
 
-    # data-email / data-mail attributes
-    try:
-        for attr in ("data-email", "data-mail", "data-contact"):
-            els = await page.query_selector_all(f"[{attr}]")
-            for el in els:
-                val = await el.get_attribute(attr)
-                if val:
-                    emails.update(re.findall(EMAIL_PATTERN, val))
-    except Exception:
-        pass
+    # JSON-LD structured data
+    for raw in snapshot["jsonld"]:
+        emails |= emails_in_jsonld(raw)
 
-    result = {e.lower() for e in emails if e and not is_junk_email(e)}
+    # data-email / data-mail / data-contact attributes
+    for val in snapshot["data"]:
+        emails |= emails_in_text(val)
 
     if debug:
-        print(f"[DEBUG] Extracted {len(result)} email(s) from page.")
+        print(f"[DEBUG] Extracted {len(emails)} email(s) from page.")
 
-    return result
+    return emails
 
 
-async def extract_navigation_links(page: Page, base_url: str, debug=False) -> set[str]:
+def links_from_snapshot(snapshot: dict | None, base_url: str, debug=False) -> set[str]:
     links: set[str] = set()
-    current_url = page.url or base_url  # use actual current URL as base
-
-    async def _from(selector: str, limit=None):
-        try:
-            elements = await page.query_selector_all(selector)
-            for a in (elements[:limit] if limit else elements):
-                href = await a.get_attribute("href")
-                if href and not href.startswith(("javascript:", "#", "tel:", "mailto:")):
-                    links.add(urljoin(current_url, href))
-        except Exception:
-            pass
-
-    await _from("nav a[href]")
-    await _from("header a[href]")
-    await _from("footer a[href]")      # footer often has contact/about
-    await _from("aside a[href]")
-    await _from("a[href]", limit=150)  # fallback catch-all
+    if not snapshot:
+        return links
+    current_url = snapshot["url"] or base_url  # use actual current URL as base
+    for href in snapshot["links"]:
+        if not href.startswith(("javascript:", "#", "tel:", "mailto:")):
+            links.add(urljoin(current_url, href))
 
     if debug:
         print(f"[DEBUG] Found {len(links)} navigation links.")
     return links
 
 
-async def visit_url(page: Page, url: str, debug=False) -> set[str]:
-    """Navigate to url and extract emails. Tolerates networkidle timeout."""
+async def extract_emails_from_page(page: Page, debug=False) -> set[str]:
+    return emails_from_snapshot(await snapshot_page(page), debug=debug)
+
+
+async def extract_navigation_links(page: Page, base_url: str, debug=False) -> set[str]:
+    return links_from_snapshot(await snapshot_page(page), page.url or base_url, debug=debug)
+
+
+class ResponseHarvester:
+    """
+    Scans JSON and text bodies of a context's XHR/fetch responses for
+    emails as they arrive.  Headless CMSs and site builders (Wix,
+    Squarespace, …) often load contact details this way, sometimes on
+    pages that never finish rendering.  `found` is set on the first email
+    since the last reset(), letting the page wait end early.
+    """
+
+    def __init__(self, debug=False) -> None:
+        self.debug = debug
+        self.emails: set[str] = set()
+        self.found = asyncio.Event()
+        self._tasks: set[asyncio.Task] = set()
+
+    def reset(self) -> None:
+        """Start collecting for a new page."""
+        self.emails = set()
+        self.found.clear()
+
+    def on_response(self, response) -> None:
+        if response.request.resource_type not in ("xhr", "fetch"):
+            return
+        content_type = response.headers.get("content-type", "").lower()
+        if not any(t in content_type for t in _SCANNED_CONTENT_TYPES):
+            return
+        length = response.headers.get("content-length")
+        if length and length.isdigit() and int(length) > RESPONSE_SCAN_MAX_BYTES:
+            return
+        task = asyncio.ensure_future(self._scan(response))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _scan(self, response) -> None:
+        try:
+            body = await response.body()
+        except Exception:
+            return  # body already gone (redirect, page navigated away, …)
+        if len(body) > RESPONSE_SCAN_MAX_BYTES:
+            return
+        emails = emails_in_text(body.decode("utf-8", "replace"))
+        if emails:
+            if self.debug:
+                print(f"[DEBUG] {len(emails)} email(s) in response {response.url}")
+            self.emails |= emails
+            self.found.set()
+
+    def close(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+
+
+# Resolves once the DOM has been quiet for quietMs, an email appears in the
+# page, or budgetMs runs out — whichever comes first
+_SETTLE_JS = """
+([quietMs, budgetMs, pattern]) => new Promise(resolve => {
+    const re = new RegExp(pattern);
+    let done = false, quiet = null, budget = null, observer = null;
+    const finish = reason => {
+        if (done) return;
+        done = true;
+        if (observer) observer.disconnect();
+        clearTimeout(quiet);
+        clearTimeout(budget);
+        resolve(reason);
+    };
+    const hasEmail = node => re.test((node && node.textContent) || "");
+
+    if (document.body && re.test(document.body.innerText)) return finish("email");
+    observer = new MutationObserver(mutations => {
+        for (const m of mutations) {
+            if (hasEmail(m.target)) return finish("email");
+            for (const n of m.addedNodes) if (hasEmail(n)) return finish("email");
+        }
+        clearTimeout(quiet);
+        quiet = setTimeout(() => finish("settled"), quietMs);
+    });
+    observer.observe(document, {childList: true, subtree: true, characterData: true});
+    quiet = setTimeout(() => finish("settled"), quietMs);
+    budget = setTimeout(() => finish("budget"), budgetMs);
+})
+"""
+
+
+async def wait_until_ready(
+    page: Page,
+    wait_strategy: str = ADAPTIVE,
+    debug=False,
+    early: asyncio.Event | None = None,
+    deadline: Deadline | None = None,
+) -> float:
+    """
+    Wait for a navigated page to render; returns the seconds waited.
+    Setting `early` (e.g. ResponseHarvester.found) ends the wait at once.
+    The wait never outlasts what is left of `deadline`.
+    """
+    started = time.monotonic()
+    budget_ms = PAGE_BUDGET_MS
+    if deadline is not None:
+        budget_ms = round(min(budget_ms / 1000, deadline.remaining()) * 1000)
+    budget = budget_ms / 1000
+    if wait_strategy == NETWORKIDLE:
+        ready = asyncio.ensure_future(page.wait_for_load_state("networkidle"))
+    else:
+        ready = asyncio.ensure_future(
+            page.evaluate(_SETTLE_JS, [QUIET_MS, budget_ms, EMAIL_PATTERN])
+        )
+        budget += 1  # the script enforces the budget itself
+    waiters = {ready}
+    if early is not None:
+        early_task = asyncio.ensure_future(early.wait())
+        waiters.add(early_task)
+
+    done, pending = await asyncio.wait(waiters, timeout=budget, return_when=asyncio.FIRST_COMPLETED)
+    for waiter in pending:
+        waiter.cancel()
+
+    reason = "budget"
+    if early is not None and early_task in done:
+        reason = "response"
+    elif ready in done and not ready.cancelled() and ready.exception() is None:
+        reason = ready.result() if wait_strategy != NETWORKIDLE else "networkidle"
+    # otherwise proceed with whatever is rendered so far
+
+    waited = time.monotonic() - started
+    if debug:
+        print(f"[DEBUG] Page ready after {waited * 1000:.0f} ms ({reason}).")
+    return waited
+
+
+async def visit_url(
+    page: Page,
+    url: str,
+    debug=False,
+    state: CrawlState | None = None,
+    wait_strategy: str = ADAPTIVE,
+    harvester: ResponseHarvester | None = None,
+    deadline: Deadline | None = None,
+) -> tuple[set[str], set[str]]:
+    """
+    Navigate to url and return (emails, navigation links) from a single
+    snapshot, once wait_until_ready says the page has rendered.  The wait
+    is recorded on the state.  Emails the harvester picks up from the
+    page's XHR/fetch responses are included.  With a state, a rendered
+    page that duplicates one already visited in this crawl contributes
+    only those harvested emails, and no links.  Navigation and the wait
+    are cut to the remaining `deadline`.
+    """
     emails: set[str] = set()
+    links: set[str] = set()
+    get_browser_pool().count_page()
+    if harvester is not None:
+        harvester.reset()
+    deadline = deadline or (state.deadline if state is not None else Deadline())
     try:
-        await page.goto(url, timeout=20000, wait_until="domcontentloaded")
-        # Give JS up to 4 seconds to hydrate; don't block forever on analytics
-        try:
-            await asyncio.wait_for(
-                asyncio.ensure_future(page.wait_for_load_state("networkidle")),
-                timeout=4,
-            )
-        except (asyncio.TimeoutError, Exception):
-            pass  # proceed with whatever is rendered so far
-        emails = await extract_emails_from_page(page, debug=debug)
+        page.set_default_timeout(deadline.timeout(15) * 1000)
+        await page.goto(url, timeout=deadline.timeout(20) * 1000, wait_until="domcontentloaded")
+        # Give JS time to hydrate; don't block forever on analytics
+        waited = await wait_until_ready(
+            page, wait_strategy, debug=debug,
+            early=harvester.found if harvester is not None else None,
+            deadline=deadline,
+        )
+        if state is not None:
+            state.add_wait(waited)
+        snapshot = await snapshot_page(page)
+        if state is not None and snapshot and state.is_duplicate(
+            content_fingerprint(snapshot["html"]), scope="spa"
+        ):
+            if debug:
+                print(f"[INFO] Duplicate content, skipping: {url}")
+        else:
+            emails = emails_from_snapshot(snapshot, debug=debug)
+            links = links_from_snapshot(snapshot, url, debug=debug)
     except Exception as e:
         if debug:
             print(f"[ERROR] Visiting {url}: {e}")
-    return emails
+    if harvester is not None:
+        emails |= harvester.emails
+    return emails, links
 
 
 async def spa_extract_emails_recursive(
     start_url: str,
     max_depth: int = 2,
-    tmp_file: str = "tmp_file.txt",
     debug: bool = False,
+    state: CrawlState | None = None,
+    wait_strategy: str | None = None,
+    extra_links: set[str] | None = None,
 ) -> list[str]:
-
-    async with async_playwright() as p:
-        browser = await p.chromium.launch(
-            headless=True,
-            args=[
-                "--disable-blink-features=AutomationControlled",
-                "--disable-dev-shm-usage",
-                "--disable-gpu",
-                "--no-sandbox",
-                "--ignore-certificate-errors",
-                "--allow-insecure-localhost",
-            ],
-        )
-
-        context = await browser.new_context(
-            user_agent=REQUEST_HEADERS["User-Agent"],
-            viewport={"width": 1280, "height": 800},
-            extra_http_headers={
-                "Accept-Language": REQUEST_HEADERS["Accept-Language"],
-            },
-        )
-        page = await context.new_page()
+    """
+    Crawl a site in Chromium.  extra_links (e.g. routes named in the
+    site's JS bundles) are treated like links found on the homepage.
+    No page is visited once state.deadline has passed, or once the context
+    stays over its memory ceiling after a fresh tab (see browser_pool); the
+    emails found so far are returned.  Raises browser_pool.MemoryPressure
+    when memory is too tight to open a context at all.
+    """
+    state = state or CrawlState(site_url=start_url)
+    deadline = state.deadline
+    wait_strategy = wait_strategy or DEFAULT_WAIT_STRATEGY
+    pool = get_browser_pool()
+
+    async with pool.context(
+        user_agent=REQUEST_HEADERS["User-Agent"],
+        viewport={"width": 1280, "height": 800},
+        extra_http_headers={
+            "Accept-Language": REQUEST_HEADERS["Accept-Language"],
+        },
+    ) as context:
+        harvester = ResponseHarvester(debug=debug)
+        context.on("response", harvester.on_response)
 
         async def block_resources(route):
             req = route.request
@@ -207,82 +392,158 @@ async def spa_extract_emails_recursive(
             else:
                 await route.continue_()
 
-        await page.route("**/*", block_resources)
-        page.set_default_timeout(15000)
-        page.set_default_navigation_timeout(20000)
-
-        visited_urls: set[str] = set()
+        await context.route("**/*", block_resources)
+
+        async def _new_page() -> Page:
+            page = await context.new_page()
+            page.set_default_timeout(15000)
+            page.set_default_navigation_timeout(20000)
+            return page
+
+        page = await _new_page()
+        page_visits = 0
+        recycled_for_memory = False
+
+        async def _fit_in_memory() -> bool:
+            """
+            Swap the tab for a fresh one (and its renderer's memory) after
+            MAX_PAGES_PER_CONTEXT visits or when the context is over its
+            memory ceiling.  False when it is over again after such a swap.
+            """
+            nonlocal page, page_visits, recycled_for_memory
+            over = pool.over_limit(context)
+            if over and recycled_for_memory:
+                pool.counts["context_over_limit"] += 1
+                pool.recycle_soon()
+                if debug:
+                    print("[WARN] Context over its memory ceiling, returning partial results")
+                return False
+            if over or page_visits >= MAX_PAGES_PER_CONTEXT:
+                await page.close()
+                page = await _new_page()
+                page_visits = 0
+                recycled_for_memory = recycled_for_memory or over
+                pool.counts["page_recycled_memory" if over else "page_recycled_pages"] += 1
+            return True
+
+        visited_urls: set[str] = set()  # url_key()s
         all_emails: set[str] = set()
-        base_domain = urlparse(start_url).netloc
-
-        def _flush():
-            with open(tmp_file, "w", encoding="utf-8") as f:
-                for e in all_emails:
-                    f.write(f"{e}\n")
-                f.flush()
-                os.fsync(f.fileno())
 
-        # ── Step 1: homepage ─────────────────────────────────────────────────
-        main_emails = await visit_url(page, start_url, debug)
+        # ── Step 1: homepage (tier 1) ────────────────────────────────────────
+        state.tier = 1
+        main_emails, nav_links = await visit_url(
+            page, start_url, debug, state=state,
+            wait_strategy=wait_strategy, harvester=harvester,
+        )
+        page_visits += 1
         all_emails.update(main_emails)
-        visited_urls.add(start_url)
-        _flush()
-
-        # ── Step 2: build initial link set ───────────────────────────────────
-        nav_links = await extract_navigation_links(page, start_url, debug)
-        nav_links = {l for l in nav_links if urlparse(l).netloc == base_domain}
-
-        # Add all heuristic routes; filter to same domain
-        heuristic_links = {
-            urljoin(start_url, route) for route in COMMON_EMAIL_ROUTES
-        }
-
-        to_visit_set = (nav_links | heuristic_links) - visited_urls
+        state.add_page(main_emails, 0)
+        # Paths are resolved against wherever the homepage redirected to
+        site_url = page.url if page.url.startswith("http") else start_url
+        visited_urls.update({url_key(start_url), url_key(site_url)})
 
-        # Sort: priority pages first
-        relative_links = sorted(
-            [urlparse(l).path for l in to_visit_set],
-            key=lambda path: 0 if is_priority_link(path) else 1,
-        )
+        def _on_site(url: str) -> bool:
+            return same_site(url, site_url) or same_site(url, start_url)
 
-        # ── Step 3: recursive exploration ────────────────────────────────────
-        for depth in range(max_depth):
+        # ── Step 2: build initial link set ───────────────────────────────────
+        nav_links = {l for l in nav_links | (extra_links or set()) if _on_site(l)}
+        nav_keys = {url_key(l) for l in nav_links}
+
+        # Heuristic routes the homepage doesn't link to are only guesses;
+        # probe them over plain HTTP in the background and keep real pages
+        # (in COMMON_EMAIL_ROUTES order, most promising first)
+        heuristic_links = [
+            url for url in (urljoin(site_url, route) for route in COMMON_EMAIL_ROUTES)
+            if url_key(url) not in nav_keys
+        ]
+        probe = asyncio.ensure_future(probe_routes(site_url, heuristic_links, debug=debug))
+
+        def _by_priority(paths) -> list[str]:
+            return sorted(paths, key=lambda path: 0 if is_priority_link(path) else 1)
+
+        async def _visit_wave(tier: int, depth: int, rel_links: list[str]) -> list[str]:
+            """Visit one wave of paths; returns the paths they link to."""
+            nonlocal page_visits
+            state.tier = tier
             if debug:
-                print(f"\n[INFO] Depth {depth + 1}/{max_depth}")
+                print(f"\n[INFO] Depth {depth + 1}/{max_depth}, tier {tier}")
 
             next_relative_links: list[str] = []
-
-            for rel_link in relative_links:
-                full_url = urljoin(start_url, rel_link)
-                if full_url in visited_urls:
+            for rel_link in rel_links:
+                if deadline.expired():
+                    if debug:
+                        print("[WARN] Deadline reached, returning partial results")
+                    break
+                if not await _fit_in_memory():
+                    state.memory_capped = True
+                    break
+                full_url = urljoin(site_url, rel_link)
+                if url_key(full_url) in visited_urls:
                     continue
-                visited_urls.add(full_url)
+                visited_urls.add(url_key(full_url))
 
                 if debug:
                     print(f"[INFO] Visiting: {full_url}")
 
-                emails = await visit_url(page, full_url, debug=debug)
+                emails, new_links = await visit_url(
+                    page, full_url, debug=debug, state=state,
+                    wait_strategy=wait_strategy, harvester=harvester,
+                )
+                page_visits += 1
+                if page.url.startswith("http"):
+                    visited_urls.add(url_key(page.url))  # redirect target
                 all_emails.update(emails)
-                _flush()
+                state.add_page(emails, depth + 1)
 
                 # Gather links from this page for the next depth
-                new_links = await extract_navigation_links(page, full_url, debug=debug)
-                new_links = {l for l in new_links if urlparse(l).netloc == base_domain}
-                new_rels = [
+                new_rels = {
                     urlparse(l).path for l in new_links
-                    if urljoin(start_url, urlparse(l).path) not in visited_urls
-                ]
-                next_relative_links.extend(
-                    sorted(new_rels, key=lambda l: 0 if is_priority_link(l) else 1)
-                )
+                    if _on_site(l) and url_key(urljoin(site_url, urlparse(l).path)) not in visited_urls
+                }
+                next_relative_links.extend(_by_priority(new_rels))
+            return next_relative_links
+
+        # ── Step 3: tiered exploration ───────────────────────────────────────
+        # Tier 2 is the priority links the homepage actually points to; the
+        # probed COMMON_EMAIL_ROUTES and everything else are tier 3.
+        nav_paths = {urlparse(l).path for l in nav_links if url_key(l) not in visited_urls}
+
+        async def _with_probed(paths: set[str]) -> list[str]:
+            probed = {urlparse(l).path for l in await probe if url_key(l) not in visited_urls}
+            return _by_priority(paths | probed)
+
+        if state.tiered:
+            waves = [
+                (2, _by_priority(p for p in nav_paths if is_priority_link(p))),
+                (3, asyncio.ensure_future(
+                    _with_probed({p for p in nav_paths if not is_priority_link(p)})
+                )),
+            ]
+        else:
+            waves = [(2, asyncio.ensure_future(_with_probed(nav_paths)))]
 
-            if not next_relative_links:
-                if debug:
-                    print("[INFO] No more links to visit.")
-                break
-
-            relative_links = next_relative_links
-
-        await browser.close()
+        try:
+            for depth in range(max_depth):
+                if state.should_stop() or deadline.expired() or state.memory_capped:
+                    break
+
+                next_relative_links: list[str] = []
+                for tier, rel_links in waves:
+                    if state.should_stop() or deadline.expired() or state.memory_capped:
+                        break
+                    if asyncio.isfuture(rel_links):
+                        rel_links = await rel_links
+                    next_relative_links.extend(await _visit_wave(tier, depth, rel_links))
+
+                if not next_relative_links:
+                    if debug:
+                        print("[INFO] No more links to visit.")
+                    break
+
+                waves = [(3, next_relative_links)]
+        finally:
+            # Stopped before tier 3: the probe's answer is no longer needed
+            probe.cancel()
+            harvester.close()
 
     return sorted(all_emails)
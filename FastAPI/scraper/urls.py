@@ -0,0 +1,87 @@
+"""
+URL canonicalization shared by the crawlers.
+
+canonicalize() cleans a URL for fetching (fragment, tracking parameters,
+index pages, host case, default ports).  url_key() goes further and is
+what "visited" sets compare: http/https, www/apex and a trailing slash
+don't make a different page.  same_site() treats the www and apex hosts
+as one site, so a redirect from http://example.com to
+https://www.example.com doesn't put every discovered link off-site.
+"""
+
+from urllib.parse import parse_qsl, urlencode, urljoin, urlparse, urlunparse
+
+# Query parameters that only track where a visitor came from
+TRACKING_PARAMS = {
+    "gclid", "dclid", "fbclid", "msclkid", "yclid", "igshid", "srsltid",
+    "mc_cid", "mc_eid", "_ga", "_gl", "_hsenc", "_hsmi", "mkt_tok",
+    "hsctatracking", "trk",
+}
+TRACKING_PREFIXES = ("utm_",)
+
+# Directory index documents, equivalent to the directory itself
+INDEX_PAGES = ("index.html", "index.htm", "index.php", "default.aspx", "default.asp")
+
+_DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+def site_host(url: str) -> str:
+    """'https://WWW.Example.com:8443/x' → 'example.com'"""
+    host = (urlparse(url).hostname or "").lower().rstrip(".")
+    return host[4:] if host.startswith("www.") else host
+
+
+def same_site(a: str, b: str) -> bool:
+    """Whether two URLs belong to the same site, www and apex alike."""
+    return site_host(a) == site_host(b)
+
+
+def _is_tracking(param: str) -> bool:
+    param = param.lower()
+    return param in TRACKING_PARAMS or param.startswith(TRACKING_PREFIXES)
+
+
+def canonicalize(url: str, base: str | None = None) -> str:
+    """
+    Fetchable canonical form of url (resolved against base, if given):
+    no fragment or tracking parameters, lower-case host without a default
+    port, and /index.html (etc.) reduced to its directory.  "" when url
+    can't be parsed (a port like ":80a" or ":99999", a broken IPv6 host);
+    callers skip such links.
+    """
+    try:
+        if base is not None:
+            url = urljoin(base, url)
+        parts = urlparse(url)
+        port = parts.port
+    except ValueError:
+        return ""
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if port and port != _DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{port}"
+
+    path = parts.path or "/"
+    head, _, last = path.rpartition("/")
+    if last.lower() in INDEX_PAGES:
+        path = head + "/"
+
+    query = urlencode(
+        [(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if not _is_tracking(k)]
+    )
+    return urlunparse((scheme, host, path, parts.params, query, ""))
+
+
+def url_key(url: str) -> str:
+    """
+    Identity of a page for de-duplication: canonicalize() minus the
+    scheme, the www. prefix and any trailing slash.  A URL canonicalize()
+    can't parse is its own key.
+    """
+    canonical = canonicalize(url)
+    if not canonical:
+        return url
+    parts = urlparse(canonical)
+    host = parts.netloc[4:] if parts.netloc.startswith("www.") else parts.netloc
+    path = parts.path.rstrip("/") or "/"
+    return f"{host}{path}" + (f"?{parts.query}" if parts.query else "")
@@ -1,6 +1,15 @@
-import requests
+import hashlib
+import re
 from urllib.parse import urlparse
 from bs4 import BeautifulSoup
+from scraper.urls import same_site
+
+# ── HTML parser backend: lxml when installed, else the stdlib parser ────────
+try:
+    import lxml  # noqa: F401
+    HTML_PARSER = "lxml"
+except ImportError:
+    HTML_PARSER = "html.parser"
 
 # ── Priority contact-page keywords ───────────────────────────────────────────
 PRIORITY_KEYWORDS = [
@@ -22,8 +31,16 @@ BAD_EXTENSIONS = (
 # TLD must be 2-12 letters only (no digits) — filters out npm packages like
 # lodash@4.17.21, react@18.3.1, sentry hashes, etc.
 EMAIL_PATTERN = r"[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z]{2,12}"
+# "user [at] domain [dot] com" and friends: (at) {at} [@] " at ", (dot) [.]
+# " dot ", plain dots.  Groups: local part, "at" separator, domain + TLD.
+# The word form " at " only counts when the domain also uses a bracketed
+# dot (see html_extract), so "visit us at example.com" and "look at this dot
+# com" aren't addresses.
+OBFUSCATED_AT = r"\s*[\[({]\s*(?:at|@)\s*[\])}]\s*|\s+at\s+|@"
+OBFUSCATED_DOT = r"\s*[\[({]\s*(?:dot|\.)\s*[\])}]\s*|\s+dot\s+|\."
 OBFUSCATED_EMAIL_PATTERN = (
-    r"([a-zA-Z0-9_.+-]+)\s*\[at\]\s*([a-zA-Z0-9-]+)\s*\[dot\]\s*([a-zA-Z]{2,12})"
+    r"(?i)(?<![a-z0-9_.+-])([a-z0-9_.+-]+)(%s)((?:[a-z0-9-]+(?:%s))+[a-z]{2,12})\b"
+    % (OBFUSCATED_AT, OBFUSCATED_DOT)
 )
 
 # ── Junk email prefixes (not useful business contacts) ───────────────────────
@@ -100,53 +117,99 @@ def is_spa_site(url: str, timeout: int = 15, debug=False) -> bool:
     script src attributes instead of visible body text, which caused
     false positives on any page that *mentioned* React/Vue in content.
     """
+    from scraper.email_extractor import fetch_page
+    from scraper.http_client import get_session
     try:
-        res = requests.get(url, timeout=timeout, headers=REQUEST_HEADERS)
-        if not res.ok:
+        page = fetch_page(url, get_session(), timeout=timeout, debug=debug)
+        if page is None:
+            return False  # default to static scraper on error
+        if not page.ok:
             return True  # fallback: try SPA scraper on error
-        soup = BeautifulSoup(res.text, "html.parser")
+        return is_spa_soup(page.soup)
 
-        # 1. Almost empty body → definitely SPA
-        body = soup.body
-        body_text = body.get_text(strip=True) if body else ""
-        if not body or len(body_text) < 100:
-            return True
+    except Exception as e:
+        if debug:
+            print(f"[WARN] SPA detection error: {e}")
+        return False  # default to static scraper on error
+
+
+def is_spa_soup(soup: BeautifulSoup) -> bool:
+    """SPA heuristics for an already parsed page (see is_spa_site)."""
+    # 1. Almost empty body → definitely SPA
+    body = soup.body
+    body_text = body.get_text(strip=True) if body else ""
+    if not body or len(body_text) < 100:
+        return True
 
-        # 2. Common SPA root elements with little/no server-rendered content
-        for root_id in ("root", "__next", "app", "__nuxt", "gatsby-focus-wrapper"):
-            el = soup.find(id=root_id)
-            if el and len(el.get_text(strip=True)) < 200:
-                return True
-
-        # 3. Data attributes injected by SPA frameworks
-        if (
-            soup.find(attrs={"data-reactroot": True})
-            or soup.find(attrs={"ng-version": True})
-            or soup.find(attrs={"data-server-rendered": True})
-        ):
+    # 2. Common SPA root elements with little/no server-rendered content
+    for root_id in ("root", "__next", "app", "__nuxt", "gatsby-focus-wrapper"):
+        el = soup.find(id=root_id)
+        if el and len(el.get_text(strip=True)) < 200:
             return True
 
-        # 4. Framework hints in script *src* attributes (not body text)
-        for script in soup.find_all("script", src=True):
-            src = script["src"].lower()
-            if any(fw in src for fw in ["react", "vue", "angular", "next", "nuxt", "svelte"]):
-                return True
+    # 3. Data attributes injected by SPA frameworks
+    if (
+        soup.find(attrs={"data-reactroot": True})
+        or soup.find(attrs={"ng-version": True})
+        or soup.find(attrs={"data-server-rendered": True})
+    ):
+        return True
 
-        # 5. Lots of scripts, almost no readable content
-        scripts = soup.find_all("script")
-        if len(scripts) > 20 and len(body_text) < 300:
+    # 4. Framework hints in script *src* attributes (not body text)
+    for script in soup.find_all("script", src=True):
+        src = script["src"].lower()
+        if any(fw in src for fw in ["react", "vue", "angular", "next", "nuxt", "svelte"]):
             return True
 
-        return False
+    # 5. Lots of scripts, almost no readable content
+    scripts = soup.find_all("script")
+    if len(scripts) > 20 and len(body_text) < 300:
+        return True
 
-    except Exception as e:
-        if debug:
-            print(f"[WARN] SPA detection error: {e}")
-        return False  # default to static scraper on error
+    return False
 
 
 def is_same_domain(base_url: str, target_url: str) -> bool:
-    return urlparse(base_url).netloc == urlparse(target_url).netloc
+    """Same site, treating www and apex hosts (and ports) as one — see scraper.urls."""
+    return same_site(base_url, target_url)
+
+
+def is_on_domain_email(email: str, site_url: str) -> bool:
+    """
+    True when the email's domain is the site's own host (www. aside) or a
+    subdomain of it.  Not the other way round: support@wixsite.com isn't
+    mybiz.wixsite.com's address.
+    """
+    email_domain = email.rsplit("@", 1)[-1].lower()
+    host = (urlparse(site_url).hostname or "").lower()
+    if host.startswith("www."):
+        host = host[4:]
+    if not host:
+        return False
+    return email_domain == host or email_domain.endswith("." + host)
+
+
+_SCRIPT_STYLE_RE = re.compile(r"<(script|style|noscript)\b.*?</\1\s*>", re.I | re.S)
+_TAG_RE = re.compile(r"<[^>]+>")
+
+
+def visible_text(html: str) -> str:
+    """A page's text without markup, scripts or styles, whitespace collapsed."""
+    return " ".join(_TAG_RE.sub(" ", _SCRIPT_STYLE_RE.sub(" ", html)).split())
+
+
+def content_fingerprint(html: str, ignore: str = "") -> str:
+    """
+    Hash of a page's visible text, so two responses that render the same
+    page compare equal even when nonces, CSRF tokens or inline scripts
+    differ.  `ignore` (e.g. the requested path, which soft-404 pages often
+    echo back) is removed before hashing.
+    """
+    text = visible_text(html)
+    if ignore:
+        text = text.replace(ignore, " ")
+    text = " ".join(text.lower().split())
+    return hashlib.sha1(text.encode("utf-8", "ignore")).hexdigest()
 
 
 def is_valid_html_link(href: str) -> bool:
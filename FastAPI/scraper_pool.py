@@ -0,0 +1,355 @@
+# scraper_pool.py
+"""
+Long-lived pool of pre-warmed scraper worker processes.
+
+Each worker is a `python -m scraper_worker` process started in serve mode: it
+imports Playwright/BeautifulSoup/requests once and then reads one JSON job per
+line from stdin.  For each job it streams progress lines (newly found emails,
+pages visited, depth) and finally one result line on stdout.  Each job
+carries a time budget a little under the pool's timeout, which the worker
+spends across all its stages and retries before returning what it has; the
+pool still enforces the timeout itself, keeps everything streamed so far as
+the partial result, and replaces any worker that crashes or hangs.
+
+Workers are also recycled once they (Chromium included) use more than
+MAX_WORKER_RSS_MB.  memory_stats() reports every worker's memory and the
+recycle counts the workers send back with their results.
+"""
+
+import json
+import logging
+import os
+import queue
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from scraper import memory
+
+logger = logging.getLogger(__name__)
+
+# Defaults to the per-request scrape concurrency, then to one worker per core
+POOL_SIZE = int(os.getenv("SCRAPER_POOL_SIZE", os.getenv("SCRAPER_CONCURRENCY", str(os.cpu_count() or 4))))
+# Recycle a worker after this many jobs to cap slow leaks in long-lived processes
+MAX_JOBS_PER_WORKER = int(os.getenv("SCRAPER_WORKER_MAX_JOBS", "200"))
+# Recycle a worker once it and its Chromium processes use more than this
+MAX_WORKER_RSS_MB = int(os.getenv("SCRAPER_WORKER_MAX_RSS_MB", "2048"))
+# How long a fresh worker gets to import everything and report ready
+WORKER_START_TIMEOUT = 30
+# How long a scrape waits without any worker coming free before giving up
+# as "refused"; as long as jobs keep finishing, queued scrapes keep waiting
+WORKER_WAIT_TIMEOUT = float(os.getenv("SCRAPER_WORKER_WAIT", "120"))
+# Attempts (and seconds between them) at replacing a retired worker
+SPAWN_ATTEMPTS = 3
+SPAWN_RETRY_DELAY = 5
+# Share of a job's timeout (at most this many seconds) kept back from the
+# worker's own deadline, so it can wrap up and report partial results
+# before the pool gives up on it
+DEADLINE_HEADROOM = float(os.getenv("SCRAPER_DEADLINE_HEADROOM", "5"))
+
+_WORKER_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+class ScraperWorker:
+    """One persistent `scraper_worker --serve` process."""
+
+    def __init__(self) -> None:
+        self.jobs_done = 0
+        # Latest memory report sent with a result (see browser_pool.memory_report)
+        self.memory: dict = {}
+        self._lines: queue.Queue = queue.Queue()
+        self.proc = subprocess.Popen(
+            args=[sys.executable, '-m', 'scraper_worker', '--serve'],
+            cwd=_WORKER_DIR,
+            text=True,
+            bufsize=1,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=None,  # inherit, so worker logs end up in the container logs
+        )
+        self._reader = threading.Thread(target=self._read_stdout, daemon=True)
+        self._reader.start()
+
+    def _read_stdout(self) -> None:
+        for line in self.proc.stdout:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                self._lines.put(json.loads(line))
+            except json.JSONDecodeError:
+                logger.warning(f"Scraper worker {self.proc.pid} wrote non-JSON output: {line[:200]}")
+        self._lines.put(None)  # EOF → worker is gone
+
+    def alive(self) -> bool:
+        return self.proc.poll() is None
+
+    def rss(self) -> int:
+        """Bytes used by the worker and everything it started (Chromium)."""
+        return memory.tree_rss(self.proc.pid) if self.alive() else 0
+
+    def wait_ready(self, timeout: float) -> bool:
+        try:
+            msg = self._lines.get(timeout=timeout)
+        except queue.Empty:
+            return False
+        return bool(msg) and msg.get("status") == "ready"
+
+    def run(self, job: dict, timeout: float, partial: set[str]) -> dict | None:
+        """
+        Send one job and wait for its result, adding every email reported in
+        progress lines to `partial` as it arrives.  Returns None when the
+        deadline passes; raises RuntimeError when the worker died mid-job.
+        """
+        self.proc.stdin.write(json.dumps(job) + "\n")
+        self.proc.stdin.flush()
+
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            try:
+                msg = self._lines.get(timeout=remaining)
+            except queue.Empty:
+                return None
+            if msg is None:
+                raise RuntimeError(f"scraper worker exited with code {self.proc.poll()}")
+            if msg.get("id") != job["id"]:
+                continue
+            if msg.get("type") == "progress":
+                partial.update(msg.get("emails", []))
+                continue
+            self.jobs_done += 1
+            return msg
+
+    def stop(self) -> None:
+        """Ask the worker to exit (it closes its browser first), then make sure."""
+        try:
+            self.proc.stdin.close()
+            self.proc.wait(timeout=10)
+        except Exception:
+            pass
+        self.kill()
+
+    def kill(self) -> None:
+        try:
+            self.proc.kill()
+            self.proc.wait(timeout=5)
+        except Exception:
+            pass
+
+
+class ScraperPool:
+    """Fixed-size pool of ScraperWorker processes shared by all endpoints."""
+
+    def __init__(self, size: int = POOL_SIZE) -> None:
+        self.size = max(1, size)
+        self._idle: queue.Queue = queue.Queue()
+        self._started = False
+        self._lock = threading.Lock()
+        # Every worker spawned, for memory_stats(); dead ones are pruned there
+        self._workers: set[ScraperWorker] = set()
+        # Recycles and refusals, the workers' and the pool's own
+        self.counts: Counter = Counter()
+        self._counts_lock = threading.Lock()
+        # Workers handed back to the idle queue so far; a scrape waiting for
+        # one only gives up when this stops moving
+        self._handoffs = 0
+
+    def start(self) -> None:
+        """Spawn and warm up every worker.  Safe to call more than once."""
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+            for _ in range(self.size):
+                self._put_idle(self._try_spawn())
+
+    def shutdown(self) -> None:
+        """Stop every worker, including any still busy with a job."""
+        with self._lock:
+            self._started = False
+            while True:
+                try:
+                    worker = self._idle.get_nowait()
+                except queue.Empty:
+                    break
+                if worker is not None:
+                    worker.stop()
+                    self._workers.discard(worker)
+            # Busy workers won't read EOF until their job is done
+            for worker in list(self._workers):
+                worker.kill()
+            self._workers.clear()
+
+    def _spawn(self) -> ScraperWorker:
+        worker = ScraperWorker()
+        self._workers.add(worker)
+        if not worker.wait_ready(WORKER_START_TIMEOUT):
+            logger.warning(f"Scraper worker {worker.proc.pid} did not report ready in time")
+        return worker
+
+    def _try_spawn(self) -> ScraperWorker | None:
+        """
+        _spawn, or None when the process can't be started.  The None goes
+        into the idle queue in the worker's place, so the pool keeps its
+        size and the next scrape to pick it up tries again.
+        """
+        try:
+            return self._spawn()
+        except Exception as e:
+            logger.error(f"Could not start a scraper worker: {e}")
+            return None
+
+    def _put_idle(self, worker: ScraperWorker | None) -> None:
+        with self._counts_lock:
+            self._handoffs += 1
+        self._idle.put(worker)
+
+    def _get_idle(self) -> ScraperWorker | None:
+        """
+        The next idle worker (or placeholder).  Raises queue.Empty once a
+        whole WORKER_WAIT_TIMEOUT passes without any worker being handed
+        back, i.e. the pool is stuck rather than just busy.
+        """
+        while True:
+            handoffs = self._handoffs
+            try:
+                return self._idle.get(timeout=WORKER_WAIT_TIMEOUT)
+            except queue.Empty:
+                if self._handoffs == handoffs:
+                    raise
+
+    def _count(self, counts: dict) -> None:
+        with self._counts_lock:
+            self.counts.update(counts)
+
+    def _release(self, worker: ScraperWorker) -> None:
+        if not self._started:
+            # Shut down mid-job
+            worker.kill()
+            self._workers.discard(worker)
+            return
+        if worker.alive():
+            if worker.jobs_done >= MAX_JOBS_PER_WORKER:
+                self._count({"worker_recycled_jobs": 1})
+            elif worker.rss() > MAX_WORKER_RSS_MB * memory.MB:
+                logger.info(f"Scraper worker {worker.proc.pid} is over {MAX_WORKER_RSS_MB} MB, recycling it")
+                self._count({"worker_recycled_memory": 1})
+            else:
+                self._put_idle(worker)
+                return
+        # Retire and replace in the background so the caller isn't held up
+        threading.Thread(target=self._replace, args=(worker,), daemon=True).start()
+
+    def _replace(self, worker: ScraperWorker) -> None:
+        worker.stop()
+        self._workers.discard(worker)
+        replacement = None
+        for attempt in range(SPAWN_ATTEMPTS):
+            if not self._started:
+                return
+            if attempt:
+                time.sleep(SPAWN_RETRY_DELAY)
+            replacement = self._try_spawn()
+            if replacement is not None:
+                break
+        self._put_idle(replacement)
+
+    def scrape(self, url: str, depth: int, retries: int, timeout: float, **options) -> dict:
+        """
+        Run scrape_email for one website on a pooled worker.  Extra keyword
+        arguments (e.g. wait_strategy) are passed through to scrape_site.
+
+        Returns a dict with "status" set to one of:
+          ok       – worker finished, "emails" holds the result
+          deadline – the job's budget ran out; the worker stopped crawling
+                     and returned what it had found
+          error    – scrape_email raised on every retry, "error" holds the message
+          refused  – nothing found before the SPA stage, which memory was
+                     too tight to run, or no worker came free for
+                     WORKER_WAIT_TIMEOUT; worth retrying later
+          timeout  – deadline passed, worker was killed and replaced
+          crashed  – worker died mid-job and was replaced
+        Except for "ok", "emails" holds the partial results streamed so far.
+        """
+        self.start()
+
+        options.setdefault("budget", max(1.0, timeout - min(DEADLINE_HEADROOM, timeout * 0.2)))
+        job = {
+            "id": uuid.uuid4().hex,
+            "url": url,
+            "depth": depth,
+            "retries": retries,
+            "options": options,
+        }
+        partial: set[str] = set()
+
+        try:
+            worker = self._get_idle()
+        except queue.Empty:
+            logger.warning(f"No scraper worker free for {url} after {WORKER_WAIT_TIMEOUT}s")
+            self._count({"worker_wait_timeouts": 1})
+            return {"status": "refused", "error": "no scraper worker available", "emails": []}
+        if worker is None or not worker.alive():
+            if worker is not None:
+                worker.kill()
+                self._workers.discard(worker)
+            worker = self._try_spawn()
+            if worker is None:
+                self._put_idle(None)  # keep the slot for the next attempt
+                return {"status": "refused", "error": "could not start a scraper worker", "emails": []}
+        try:
+            try:
+                result = worker.run(job, timeout, partial)
+            except Exception as e:
+                logger.warning(f"Scraper worker crashed on {url}: {e}")
+                worker.kill()
+                return {"status": "crashed", "error": str(e), "emails": sorted(partial)}
+
+            if result is None:
+                logger.warning(f"Scrape of {url} exceeded {timeout}s, restarting worker")
+                worker.kill()
+                return {"status": "timeout", "emails": sorted(partial)}
+
+            report = result.pop("memory", None)
+            if report:
+                worker.memory = report
+                self._count(report.get("counts", {}))
+            if result.get("status") != "ok":
+                result["emails"] = sorted(partial.union(result.get("emails", [])))
+            return result
+        finally:
+            self._release(worker)
+
+
+    def memory_stats(self) -> dict:
+        """Memory per live worker (Chromium included), what's left, and recycle counts."""
+        for w in list(self._workers):
+            if not w.alive():
+                self._workers.discard(w)
+        workers = [
+            {
+                "pid": w.proc.pid,
+                "jobs_done": w.jobs_done,
+                "rss_mb": round(w.rss() / memory.MB, 1),
+                "browser_rss_mb": round(w.memory.get("browser_rss", 0) / memory.MB, 1),
+            }
+            for w in sorted(list(self._workers), key=lambda w: w.proc.pid)
+        ]
+        available = memory.available()
+        with self._counts_lock:
+            counts = dict(self.counts)
+        return {
+            "api_rss_mb": round(memory.rss() / memory.MB, 1),
+            "workers_rss_mb": round(sum(w["rss_mb"] for w in workers), 1),
+            "available_mb": None if available is None else round(available / memory.MB, 1),
+            "workers": workers,
+            "counts": counts,
+        }
+
+
+pool = ScraperPool()
@@ -1,32 +1,98 @@
-
 # scraper_worker.py
+#
+# Usage:
+#   python -m scraper_worker <website> <depth> <retries>   one-shot
+#   python -m scraper_worker --serve                       pooled
+#
+# Output is line-oriented JSON.  While crawling the worker emits progress
+# lines ({"type": "progress", "emails": [<new>], "pages": n, "depth": d});
+# the last line for a job is its result ({"status": ...}).  In serve mode
+# jobs arrive one JSON object per line on stdin and every output line
+# carries the job's "id" (see scraper_pool.py); a job's optional "options"
+# object is passed to scrape_site as keyword arguments, except "budget": the
+# seconds all retries of the job share (see scraper.deadline).  A job whose
+# budget runs out ends with {"status": "deadline", ...} and whatever emails
+# were found by then, rather than being killed by the pool.  One that found
+# nothing because memory was too tight to launch the SPA crawler ends with
+# {"status": "refused", ...}.  In serve mode every result also carries a
+# "memory" report (see browser_pool.memory_report).
 
 import asyncio
 import sys
 import json
-from scraper import scrape_email
+from scraper import scrape_site
+from scraper.deadline import Deadline
+from scraper.browser_pool import close_browser_pool, memory_report
+
+
+async def run_job(website, depth, retries, on_progress, budget=None, **options) -> dict:
+    deadline = Deadline(budget)
+    for attempt in range(1, retries + 1):
+        try:
+            result = await scrape_site(
+                website, depth=depth, debug=False, on_progress=on_progress, deadline=deadline, **options
+            )
+            if result["deadline_reached"]:
+                return {"status": "deadline", **result}
+            if result["spa_refused"]:
+                return {"status": "refused", **result}
+            return {"status": "ok", **result}
+        except Exception as e:
+            if attempt == retries or deadline.expired():
+                return {"status": "deadline" if deadline.reached else "error", "error": str(e), "emails": []}
 
 
 async def main():
     website = sys.argv[1]
     depth = int(sys.argv[2])
     retries = int(sys.argv[3])
-    tmp_file = sys.argv[4] if len(sys.argv) == 5 else "tmp_file.txt"
 
-    for attempt in range(1, retries + 1):
+    def progress(event: dict):
+        print(json.dumps({"type": "progress", **event}),flush=True)
+
+    result = await run_job(website, depth, retries, progress)
+    await close_browser_pool()
+    print(json.dumps(result),flush=True)
+    if result["status"] != "ok":
+        sys.exit(1)
+
+
+async def serve():
+    # Anything the scrapers print must not corrupt the protocol stream
+    protocol = sys.stdout
+    sys.stdout = sys.stderr
+
+    def send(msg: dict):
+        protocol.write(json.dumps(msg) + "\n")
+        protocol.flush()
+
+    loop = asyncio.get_running_loop()
+    send({"status": "ready"})
+
+    while True:
+        line = await loop.run_in_executor(None, sys.stdin.readline)
+        if not line:
+            # Parent closed stdin → shut down, taking Chromium with us
+            await close_browser_pool()
+            return
         try:
-            emails = await scrape_email(website, depth=depth, tmp_file=tmp_file,debug=False)
-            print(json.dumps({"status": "ok", "emails": emails}),flush=True)
-            return  # Success → exit main
-        except Exception as e:
-            if attempt == retries:
-                # On last attempt → print error and exit
-                print(json.dumps({"status": "error", "error": str(e)}),flush=True)
-                sys.exit(1)
+            job = json.loads(line)
+        except json.JSONDecodeError:
+            continue
 
-if __name__ == '__main__':
-    # loop = asyncio.get_event_loop()
-    # asyncio.set_event_loop(loop)
-    # loop.run_until_complete(main())
-    asyncio.run(main())
+        def progress(event: dict, job_id=job["id"]):
+            send({"id": job_id, "type": "progress", **event})
+
+        result = await run_job(
+            job["url"], int(job["depth"]), int(job["retries"]), progress, **job.get("options", {})
+        )
+        result["id"] = job["id"]
+        result["memory"] = memory_report()
+        send(result)
 
+
+if __name__ == '__main__':
+    if len(sys.argv) == 2 and sys.argv[1] == "--serve":
+        asyncio.run(serve())
+    else:
+        asyncio.run(main())
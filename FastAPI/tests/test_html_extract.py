@@ -0,0 +1,97 @@
+"""
+Regression tests for scraper.html_extract against the HTML fixtures in
+fixtures/html.
+
+EXPECTED is what scrape_page returned for each fixture before extraction
+moved to a single traversal; extract_emails_and_links must keep returning
+exactly that under both parser backends.
+"""
+
+from pathlib import Path
+
+import pytest
+from bs4 import BeautifulSoup
+
+from scraper.html_extract import emails_in_text, extract_emails_and_links
+
+FIXTURES = Path(__file__).parent / "fixtures" / "html"
+BASE_URL = "https://acme.com/"
+PARSERS = ["html.parser", "lxml"]
+
+EXPECTED = {
+    "text.html": (
+        {"info@acme.com", "office@acme.com", "sales@acme.com"},
+        {
+            "https://acme.com/",
+            "https://acme.com/about",
+            "https://acme.com/contact",
+            "https://acme.com/services",
+            "https://acme.com/team",
+        },
+    ),
+    "mailto.html": (
+        {"bookings@acme.com", "owner@acme.com"},
+        {"https://acme.com/contact/"},
+    ),
+    "attributes.html": (
+        {
+            "billing@acme.com", "careers@acme.com", "events@acme.com", "hello@acme.com",
+            "press@acme.com", "shop@acme.com", "support@acme.com",
+        },
+        set(),
+    ),
+    "jsonld.html": (
+        {"broken@acme.com", "contact@acme.com", "hq@acme.com", "quotes@acme.com", "social@acme.com"},
+        set(),
+    ),
+    "scripts_comments.html": (
+        {"help@acme.com", "hidden@acme.com", "legacy@acme.com", "web@acme.com"},
+        {"https://acme.com/faq"},
+    ),
+    "malformed.html": (
+        # get_text() runs adjacent table cells together; scrape_page did too
+        {"after@acme.com", "desk@acme.com", "frontdesk@acme.comnext", "owner@acme.com"},
+        {"https://acme.com/about", "https://acme.com/contact"},
+    ),
+}
+
+
+def extract(name: str, parser: str) -> tuple[set[str], set[str]]:
+    html = (FIXTURES / name).read_text(encoding="utf-8")
+    return extract_emails_and_links(BeautifulSoup(html, parser), BASE_URL)
+
+
+@pytest.mark.parametrize("parser", PARSERS)
+@pytest.mark.parametrize("name", sorted(EXPECTED))
+def test_matches_scrape_page(name, parser):
+    assert extract(name, parser) == EXPECTED[name]
+
+
+@pytest.mark.parametrize("parser", PARSERS)
+def test_cloudflare_email_protection(parser):
+    emails, links = extract("cfemail.html", parser)
+    assert emails == {"info@acme.com", "sales@acme.com"}
+    # The protection endpoint isn't a page worth crawling
+    assert links == set()
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("info [at] acme [dot] com", {"info@acme.com"}),
+    ("info(at)acme(dot)co(dot)uk", {"info@acme.co.uk"}),
+    ("sales {at} acme.com", {"sales@acme.com"}),
+    ("info at acme [dot] com", {"info@acme.com"}),
+    ("info@acme dot com", {"info@acme.com"}),
+    ("write to hello@acme.com", {"hello@acme.com"}),
+])
+def test_obfuscated_addresses(text, expected):
+    assert emails_in_text(text) == expected
+
+
+@pytest.mark.parametrize("text", [
+    "visit us at example.com",
+    "look at this dot com bubble",
+    "we're open at times dot and",
+    "meet at noon dot then leave",
+])
+def test_prose_is_not_an_address(text):
+    assert emails_in_text(text) == set()